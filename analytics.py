@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+# Position sizes are quoted in lots of 1,000 units of the base currency
+LOT_SIZE = 1000
+SECONDS_PER_YEAR = 365.25 * 86400
+
+
+def calc_drawdowns(equity):
+    """
+    Returns the drawdown from the running high water mark and the
+    number of periods spent in that drawdown, for each value of an
+    equity curve given as a NumPy array. The high water mark starts
+    at zero and NaN values never raise it.
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    marks = np.where(np.isnan(equity), -np.inf, equity)
+    if len(marks):
+        marks[0] = 0.0
+    hwm = np.maximum.accumulate(marks)
+    drawdown = hwm - equity
+    if len(drawdown):
+        drawdown[0] = np.nan
+    underwater = drawdown > 0
+    indx = np.arange(len(drawdown))
+    last_high = np.maximum.accumulate(np.where(underwater, -1, indx))
+    duration = np.where(underwater, indx - last_high, 0)
+    return drawdown, duration
+
+
+def infer_periods_per_year(index):
+    """
+    Estimates the number of periods per year from the median
+    spacing of a datetime-like index, defaulting to 252.
+    """
+    try:
+        times = pd.to_datetime(index).values.astype("datetime64[s]").astype(np.int64)
+    except (TypeError, ValueError):
+        return 252.0
+    if len(times) < 2:
+        return 252.0
+    spacing = np.median(np.diff(times))
+    if spacing <= 0:
+        return 252.0
+    return SECONDS_PER_YEAR / spacing
+
+
+class PerformanceReport(object):
+    """
+    PerformanceReport holds the statistics of a backtest together
+    with its equity curve DataFrame, "equity_curve".
+    """
+    def __init__(self, equity_curve, stats, attribution):
+        self.equity_curve = equity_curve
+        self.stats = stats
+        self.attribution = attribution
+        for name, value in stats.items():
+            setattr(self, name, value)
+
+    def to_dict(self):
+        report = dict(self.stats)
+        for pair, pnl in self.attribution.items():
+            report["pnl_%s" % pair] = pnl
+        return report
+
+    def __str__(self):
+        lines = ["%s: %s" % (name, value) for name, value in self.stats.items()]
+        lines += ["PnL %s: %s" % (pair, pnl) for pair, pnl in self.attribution.items()]
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return str(self)
+
+
+def create_performance_report(df, trades, open_pnl, periods_per_year=None):
+    """
+    Computes the performance statistics of a backtest from its
+    equity curve DataFrame, which must have "Total", "Returns",
+    "Equity" and "Drawdown" columns, from the list of trades made
+    by the portfolio and from a dict of the open profit of each
+    pair at the end. Every statistic is computed from whole NumPy
+    arrays.
+    """
+    if periods_per_year is None:
+        periods_per_year = infer_periods_per_year(df.index)
+    total = df["Total"].values.astype(np.float64)
+    returns = df["Returns"].values[1:].astype(np.float64)
+    returns = returns[~np.isnan(returns)]
+    drawdown, duration = calc_drawdowns(df["Equity"].values)
+
+    mean = returns.mean() if len(returns) else 0.0
+    std = returns.std(ddof=1) if len(returns) > 1 else 0.0
+    downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2)) if len(returns) else 0.0
+    ann = np.sqrt(periods_per_year)
+    years = len(total) / periods_per_year if periods_per_year else 0.0
+    if years > 0 and len(total) and total[0] > 0:
+        cagr = (total[-1] / total[0]) ** (1.0 / years) - 1.0
+    else:
+        cagr = 0.0
+
+    trade_df = pd.DataFrame(trades, columns=["time", "instrument", "side", "units", "pnl"])
+    closed = trade_df["pnl"].values.astype(np.float64)
+    closed = closed[closed != 0.0]
+    mean_equity = total.mean() if len(total) else 0.0
+    traded = trade_df["units"].values.astype(np.float64).sum() * LOT_SIZE
+
+    stats = {
+        "total_return": (total[-1] / total[0] - 1.0) if len(total) else 0.0,
+        "cagr": cagr,
+        "sharpe": (ann * mean / std) if std > 0 else 0.0,
+        "sortino": (ann * mean / downside) if downside > 0 else 0.0,
+        "max_drawdown": np.nanmax(drawdown) if len(drawdown) > 1 else 0.0,
+        "max_drawdown_duration": int(duration.max()) if len(duration) else 0,
+        "trades": len(trade_df),
+        "hit_rate": (closed > 0).mean() if len(closed) else 0.0,
+        "turnover": (traded / mean_equity) if mean_equity else 0.0
+    }
+    realised = trade_df.groupby("instrument")["pnl"].sum()
+    attribution = {}
+    for pair, pnl in open_pnl.items():
+        attribution[pair] = float(realised.get(pair, 0.0)) + float(pnl)
+    return PerformanceReport(df, stats, attribution)
@@ -0,0 +1,293 @@
+import asyncio
+import logging
+import time
+import aiohttp
+
+from event import stamping
+from execution import Execution
+from restful import RESTaccessor
+
+
+class AsyncRESTaccessor(RESTaccessor):
+    """
+    AsyncRESTaccessor adds non-blocking versions of the request
+    helpers on top of RESTaccessor. Requests share one aiohttp
+    session whose connector keeps up to "pool_size" persistent
+    connections open to the trading server, and their round-trip
+    times are recorded in the same latency histograms.
+
+    The blocking helpers are still available for the components
+    that run on their own threads, such as StreamingForexPrices.
+    """
+    def __init__(
+        self, ACCOUNT_ID, TRADING_API_URL, WEBSOCKET_PORT, ACCESS_TOKEN, **kwargs
+    ):
+        super(AsyncRESTaccessor, self).__init__(
+            ACCOUNT_ID, TRADING_API_URL, WEBSOCKET_PORT, ACCESS_TOKEN, **kwargs
+        )
+        self.async_session = None
+
+    async def open(self):
+        if self.async_session is None:
+            connect_timeout, read_timeout = self.timeout
+            self.async_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=connect_timeout, sock_read=read_timeout
+                )
+            )
+
+    async def close(self):
+        if self.async_session is not None:
+            await self.async_session.close()
+            self.async_session = None
+
+    async def async_process_response(self, rresp):
+        if rresp.status == 200:
+            data = await rresp.json(content_type=None)
+            if data["response"]["executed"] is True:
+                return True, data
+            return False, data["response"]["error"]
+        else:
+            return False, rresp.status
+
+    async def async_request_processor(self, method, params):
+        """ Non-blocking trading server GET request. """
+        await self.open()
+        start = time.perf_counter()
+        try:
+            async with self.async_session.get(
+                self.TRADING_API_URL + method, headers=self.request_headers(), params=params
+            ) as rresp:
+                return await self.async_process_response(rresp)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return False, str(e)
+        finally:
+            self.record_latency(method, time.perf_counter() - start)
+
+    async def async_post_request_processor(self, method, params):
+        """ Non-blocking trading server POST request. """
+        await self.open()
+        start = time.perf_counter()
+        try:
+            async with self.async_session.post(
+                self.TRADING_API_URL + method, headers=self.request_headers(), data=params
+            ) as rresp:
+                return await self.async_process_response(rresp)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return False, str(e)
+        finally:
+            self.record_latency(method, time.perf_counter() - start)
+
+
+class AsyncExecution(Execution):
+    """
+    AsyncExecution submits orders through an AsyncRESTaccessor,
+    with the same parameters as Execution.
+    """
+    async def execute_order(self, event):
+        status, response = await self.RESTaccess.async_post_request_processor(
+            '/trading/open_trade', self.order_params(event)
+        )
+        if status is True:
+            self.logger.info('Order has been executed: {}'.format(response))
+        else:
+            self.logger.error('Order execution error: {}'.format(response))
+        return status, response
+
+
+class EventQueueBridge(object):
+    """
+    EventQueueBridge gives the synchronous components (strategy,
+    portfolio, price streaming) the queue.put interface they
+    already use, while handing events to the asyncio runtime.
+    Orders are routed to their own queue so that submitting them
+    never holds up the processing of ticks. put() is safe to call
+    from any thread: on the loop's own thread the event is queued
+    at once, so it is counted by the queue before the handler that
+    produced it returns, and from other threads it is handed over
+    with call_soon_threadsafe.
+    """
+    def __init__(self):
+        self.loop = None
+        self.events = None
+        self.orders = None
+
+    def attach(self, loop, events, orders):
+        self.loop = loop
+        self.events = events
+        self.orders = orders
+
+    def put(self, event):
+        target = self.orders if event.type == 'ORDER' else self.events
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            target.put_nowait(event)
+        else:
+            self.loop.call_soon_threadsafe(target.put_nowait, event)
+
+
+class AsyncTradingRuntime(object):
+    """
+    AsyncTradingRuntime runs the price feed, the strategy and
+    portfolio, and order execution as cooperating asyncio tasks.
+
+    Ticks and signals are handled in order by a single dispatch
+    task. Each order is submitted in its own task, with at most
+    "max_inflight_orders" outstanding, so an HTTP round-trip to
+    the broker never delays the next tick. Orders for the same
+    instrument are submitted one at a time, in the order they
+    were raised, so a close never overtakes the open before it.
+
+    With a PipelineMonitor as "monitor", the queue wait and
+    handler times of every event and the REST round-trips of the
+    execution's accessor are recorded and periodically reported.
+    Events are only timestamped while run is running.
+
+    Components are built against runtime.events, e.g.
+
+        runtime = AsyncTradingRuntime()
+        strategy = MovingAverageCrossStrategy(instrument, runtime.events)
+        asyncio.run(runtime.run(strategy, portfolio, execution, feed))
+    """
+    def __init__(self, max_inflight_orders=10, monitor=None):
+        self.events = EventQueueBridge()
+        self.max_inflight_orders = max_inflight_orders
+        self.monitor = monitor
+        self.logger = logging.getLogger(__name__)
+
+    async def dispatch_events(self, event_queue, strategy, portfolio):
+        handlers = {
+            'TICK': [('strategy', strategy.calculate_signals),
+                     ('portfolio', portfolio.update_portfolio)],
+            'SIGNAL': [('portfolio.signal', portfolio.execute_signal)]
+        }
+        while True:
+            event = await event_queue.get()
+            try:
+                self.handle_event(event, handlers.get(event.type, []))
+            finally:
+                event_queue.task_done()
+
+    def handle_event(self, event, handlers):
+        """
+        Passes an event to each of its (stage, handler) pairs. An
+        exception in a handler is logged rather than allowed to
+        stop the dispatch task, which would leave run waiting on
+        the queue forever.
+        """
+        monitor = self.monitor
+        if monitor is not None and event.created:
+            monitor.record("queue_wait." + event.type, time.perf_counter() - event.created)
+        for stage, handler in handlers:
+            start = time.perf_counter()
+            try:
+                handler(event)
+            except Exception:
+                self.logger.exception("Handler %s failed on %s" % (stage, event))
+            if monitor is not None:
+                monitor.record(stage, time.perf_counter() - start)
+        if monitor is not None:
+            monitor.report()
+
+    async def submit_order(self, execution, order, semaphore, lock):
+        # The instrument's lock is taken first, and is handed out
+        # in the order it was asked for, so a waiting order does
+        # not hold one of the in-flight slots
+        async with lock:
+            async with semaphore:
+                try:
+                    await execution.execute_order(order)
+                except Exception:
+                    self.logger.exception("Order submission failed: %s" % order)
+
+    async def submit_orders(self, order_queue, execution, inflight):
+        semaphore = asyncio.Semaphore(self.max_inflight_orders)
+        locks = {}
+        while True:
+            order = await order_queue.get()
+            lock = locks.get(order.instrument)
+            if lock is None:
+                lock = locks[order.instrument] = asyncio.Lock()
+            task = asyncio.ensure_future(self.submit_order(execution, order, semaphore, lock))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+            order_queue.task_done()
+
+    async def run(self, strategy, portfolio, execution, price_feed):
+        """
+        Runs until the price feed coroutine returns and every
+        event and order it caused has been processed. "price_feed"
+        is called with runtime.events and is expected to put
+        TickEvents on it, from the loop or from another thread.
+        """
+        event_queue = asyncio.Queue()
+        order_queue = asyncio.Queue()
+        inflight = set()
+        rest = getattr(execution, 'RESTaccess', None)
+        if self.monitor is not None and rest is not None:
+            self.monitor.add_source('rest', rest.latency)
+        self.events.attach(asyncio.get_event_loop(), event_queue, order_queue)
+        with stamping(self.monitor is not None):
+            tasks = [
+                asyncio.ensure_future(self.dispatch_events(event_queue, strategy, portfolio)),
+                asyncio.ensure_future(self.submit_orders(order_queue, execution, inflight))
+            ]
+            try:
+                await price_feed(self.events)
+                # Let callbacks scheduled from other threads land first
+                await asyncio.sleep(0)
+                await event_queue.join()
+                await order_queue.join()
+                if inflight:
+                    await asyncio.wait(list(inflight))
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+def streaming_price_feed(prices, RESTaccess):
+    """
+    Returns a price feed coroutine for the live FXCM websocket.
+    The socketIO client FXCM's stream is read with only has a
+    blocking API, so rather than running as a native asyncio
+    websocket task, the subscription and socketIO wait run on
+    executor threads. StreamingForexPrices puts its ticks onto the
+    bridge it was constructed with, which hands them to the loop.
+    """
+    async def feed(events):
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, prices.stream_to_queue)
+        await loop.run_in_executor(None, RESTaccess.socketIO.wait)
+    return feed
+
+
+if __name__ == "__main__":
+    from mockserver import MockFXCMServer, SimulatedPriceStream
+    from portfolio import Portfolio
+    from strategy import TestRandomStrategy
+
+    # Trade against a local mock FXCM server with a simulated
+    # price feed, so the runtime can be exercised offline
+    logging.basicConfig(level=logging.INFO)
+    instrument = ["EUR/USD"]
+
+    async def main():
+        server = MockFXCMServer(port=8089)
+        await server.start()
+        RESTaccess = AsyncRESTaccessor('1', server.url, 8089, 'token')
+        runtime = AsyncTradingRuntime()
+        prices = SimulatedPriceStream(instrument, num_ticks=1000)
+        portfolio = Portfolio(prices, runtime.events, backtest=False, equity=1000000.0)
+        strategy = TestRandomStrategy(instrument, runtime.events)
+        execution = AsyncExecution(RESTaccess)
+        try:
+            await runtime.run(strategy, portfolio, execution, prices.stream)
+        finally:
+            await RESTaccess.close()
+            await server.stop()
+        print("Orders received by mock server: %d" % len(server.orders))
+
+    asyncio.get_event_loop().run_until_complete(main())
@@ -3,14 +3,17 @@ try:
 except ImportError:
     import queue
 import time
-import pandas as pd
 from socketIO_client import SocketIO
 
 from strategy import TestRandomStrategy, MovingAverageCrossStrategy
 from portfolio import Portfolio
 from execution import SimulatedExecution
 from price import HistoricCSVPriceHandler
+from candlecache import CandleCache
 from restful import RESTaccessor
+from dispatcher import EventDispatcher
+from event import TickEventPool, stamping
+from bars import BarAggregator
 
 class Backtest(object):
     """
@@ -21,10 +24,31 @@ class Backtest(object):
         self, pairs, data_handler, strategy,
         strategy_params, portfolio, execution,
         equity=1000000.0, heartbeat=0.0,
-        max_iters=10000000000
+        max_iters=10000000000, output_dir=".", reuse_events=False,
+        batch_size=10000, execution_params=None, monitor=None,
+        bar_timeframes=None
     ):
         """
-        Initialises the backtest.
+        Initialises the backtest. If "reuse_events" is True, tick
+        events are recycled through a TickEventPool rather than
+        allocated afresh for every tick.
+
+        Strategies that implement calculate_signals_batch are fed
+        blocks of "batch_size" ticks at a time, provided the data
+        handler can stream batches.
+
+        The execution handler is built with "execution_params". If
+        it fills orders itself, like SimulatedBroker, it sees every
+        tick and the portfolio waits for its fills.
+
+        If a PipelineMonitor is given as "monitor", events are
+        timestamped while simulate_trading runs and the latency of
+        each pipeline stage is reported through it at the end of
+        the run.
+
+        If "bar_timeframes" are given, e.g. ("1m", "1h"), ticks are
+        aggregated into bars of those timeframes and each completed
+        BarEvent is passed to the strategy's calculate_bar_signals.
         """
         self.pairs = pairs
         self.events = queue.Queue()
@@ -36,57 +60,132 @@ class Backtest(object):
         self.equity = equity
         self.heartbeat = heartbeat
         self.max_iters = max_iters
-        self.portfolio = portfolio(self.ticker, self.events, backtest=True, equity=self.equity)
-        self.execution = execution()
+        self.batch_size = batch_size
+        self.output_dir = output_dir
+        self.portfolio = portfolio(
+            self.ticker, self.events, backtest=True,
+            equity=self.equity, output_dir=self.output_dir
+        )
+        self.execution = execution(**(execution_params or {}))
+        if getattr(self.execution, "fills_orders", False):
+            self.execution.attach(self.events, self.ticker)
+            self.portfolio.fill_on_signal = False
+        self.event_pool = TickEventPool() if reuse_events else None
+        self.ticker.event_pool = self.event_pool
+        self.monitor = monitor
+        self.bars = None
+        if bar_timeframes:
+            self.bars = BarAggregator(self.events, bar_timeframes)
+        self.dispatcher = self.create_dispatcher()
+        self.results = None
+
+    def use_batches(self):
+        return (
+            self.batch_size and self.strategy.supports_batch()
+            and hasattr(self.ticker, "stream_next_batch")
+        )
+
+    def create_dispatcher(self):
+        """
+        Routes each event type to the components that handle it.
+        In batch mode the strategy sees ticks through
+        calculate_signals_batch instead.
+        """
+        dispatcher = EventDispatcher(self.events, monitor=self.monitor)
+        if not self.use_batches():
+            dispatcher.register('TICK', self.strategy.calculate_signals, 'strategy')
+        if getattr(self.execution, "fills_orders", False):
+            dispatcher.register('TICK', self.execution.on_tick, 'execution.tick')
+            dispatcher.register('FILL', self.portfolio.on_fill, 'portfolio.fill')
+        if self.bars is not None:
+            dispatcher.register('TICK', self.bars.on_tick, 'bars')
+            dispatcher.register('BAR', self.strategy.calculate_bar_signals, 'strategy.bar')
+        dispatcher.register('TICK', self.portfolio.update_portfolio, 'portfolio')
+        dispatcher.register('SIGNAL', self.portfolio.execute_signal, 'portfolio.signal')
+        dispatcher.register('ORDER', self.execution.execute_order, 'execution')
+        if self.event_pool is not None:
+            dispatcher.register('TICK', self.event_pool.release)
+        return dispatcher
 
     def _run_backtest(self):
         """
-        Carries out an infinite while loop that polls the
-        events queue and directs each event to either the
-        strategy component of the execution handler. The
-        loop will then pause for "heartbeat" seconds and
-        continue unti the maximum number of iterations is
-        exceeded.
+        Drains and dispatches every pending event, streaming the
+        next tick only once the queue is empty, until the data
+        runs out or the maximum number of iterations is exceeded.
+        There is no pause between events unless a non-zero
+        "heartbeat" is given.
         """
         print("Running Backtest...")
+        if self.use_batches():
+            self._run_backtest_batches()
+            return
         iters = 0
         while iters < self.max_iters and self.ticker.continue_backtest:
-            try:
-                event = self.events.get(False)
-            except queue.Empty:
+            handled = self.dispatcher.drain(block=False)
+            if handled == 0:
                 self.ticker.stream_next_tick()
-            else:
-                if event is not None:
-                    if event.type == 'TICK':
-                        self.strategy.calculate_signals(event)
-                        self.portfolio.update_portfolio(event)
-                    elif event.type == 'SIGNAL':
-                        self.portfolio.execute_signal(event)
-                    elif event.type == 'ORDER':
-                        self.execution.execute_order(event)
-            time.sleep(self.heartbeat)
-            iters += 1
+                handled = 1
+            if self.heartbeat:
+                time.sleep(self.heartbeat)
+            iters += handled
+
+    def _run_backtest_batches(self):
+        """
+        Streams ticks in blocks and hands each block to the
+        strategy's calculate_signals_batch. The ticks are then
+        replayed one at a time through the rest of the pipeline,
+        with each signal placed on the queue at the tick that
+        raised it, so the portfolio sees exactly the sequence of
+        events the per-tick path produces.
+        """
+        iters = 0
+        while iters < self.max_iters and self.ticker.continue_backtest:
+            batch = self.ticker.stream_next_batch(self.batch_size)
+            if batch is None:
+                break
+            signals = self.strategy.calculate_signals_batch(batch)
+            j = 0
+            for i in range(len(batch)):
+                tev = self.ticker.replay_batch_tick(batch, i)
+                while j < len(signals) and signals[j][0] == i:
+                    self.events.put(signals[j][1])
+                    j += 1
+                self.dispatcher.dispatch(tev)
+                iters += 1 + self.dispatcher.drain(block=False)
 
     def _output_performance(self):
         """
         Outputs the strategy performance from the backtest.
         """
         print("Calculating Performance Metrics...")
-        self.portfolio.output_results()
+        self.results = self.portfolio.output_results()
+        print("Dispatch latency: %s" % self.dispatcher.latency_summary())
+        if self.monitor is not None:
+            print("Pipeline latency: %s" % self.monitor.format_summary())
+            self.monitor.report(force=True)
 
     def simulate_trading(self):
         """
         Simulates the backtest and outputs portfolio performance.
         """
-        self._run_backtest()
+        with stamping(self.monitor is not None):
+            self._run_backtest()
+            if self.bars is not None:
+                self.bars.flush()
+                self.dispatcher.drain(block=False)
         self._output_performance()
         print("Backtest complete.")
 
-def generate_historical(pairs):
+def connect_fxcm(pool_size=10):
+    """
+    Returns a RESTaccessor authenticated against the FXCM demo
+    server over its websocket.
+    """
     RESTaccess = RESTaccessor('1583865',
                               'https://api-demo.fxcm.com:443',
                               443,
-                              '4fd104ad7e3086df1e07cd8c9f5c53df94ced618')
+                              '4fd104ad7e3086df1e07cd8c9f5c53df94ced618',
+                              pool_size=pool_size)
 
     RESTaccess.socketIO = SocketIO(RESTaccess.TRADING_API_URL, RESTaccess.WEBSOCKET_PORT,
                                    params={'access_token': RESTaccess.ACCESS_TOKEN})
@@ -94,21 +193,57 @@ def generate_historical(pairs):
     RESTaccess.socketIO.on('disconnect', RESTaccess.on_close)
     RESTaccess.bearer_access_token = RESTaccess.create_bearer_token(RESTaccess.ACCESS_TOKEN,
                                                                     RESTaccess.socketIO._engineIO_session.id)
-    # after /candles the number 1 is the offer ID (instrument EUR/USD) and the D1 is the candlestick period
-    hist_status, hist_response = RESTaccess.request_processor('/candles/1/H1', {
-        'num': 1000,
-        'from': 1494086400,
-        'to': 1503835200
-    })
-    if hist_status is True:
-        hist_data = hist_response['candles']
-        df = pd.DataFrame(hist_data)
-        df.columns = ["time", "bidopen", "bidclose", "bidhigh", "bidlow", "askopen", "askclose", "askhigh",
-                      "asklow", "TickQty"]
-        df["time"] = pd.to_datetime(df["time"], unit='s')
-        df["time"] = df["time"].values.astype('datetime64[D]')
-        df.set_index("time", inplace=True)
-        df.to_csv("%s.csv" % pairs[0].replace("/",""))
+    return RESTaccess
+
+
+def cache_historical(pairs, cache_root="cache", period="H1",
+                     start=1494086400, end=1503835200, max_workers=4,
+                     rate=5.0, offline=False):
+    """
+    Fills a CandleCache under "cache_root" with the candles of
+    each pair over [start, end] and returns them in a dict keyed
+    by pair. Only the parts of the range the cache does not
+    already hold are downloaded, and the FXCM connection is only
+    made if there are any; with "offline" set, nothing is. The
+    candles end up in the NumpyTickStore at "cache_root/period",
+    which HistoricNumpyPriceHandler reads by default.
+
+    Raises a ValueError if a pair has no candles in the range,
+    e.g. when running offline on an empty cache.
+    """
+    cache = CandleCache(
+        cache_root, connect=lambda: connect_fxcm(max_workers),
+        offline=offline, max_workers=max_workers, rate=rate
+    )
+    candles = {}
+    for pair in pairs:
+        df = cache.get(pair, period, start, end)
+        if not len(df):
+            raise ValueError(
+                "No %s %s candles over %s-%s in the cache at %s%s" % (
+                    pair, period, start, end, cache_root,
+                    " (offline)" if offline else ""
+                )
+            )
+        candles[pair] = df
+    return candles
+
+
+def generate_historical(pairs, cache_root="cache", period="H1",
+                        start=1494086400, end=1503835200, max_workers=4,
+                        rate=5.0, offline=False):
+    """
+    Writes the candles of each pair over [start, end] to the CSV
+    file HistoricCSVPriceHandler reads, taking them from a
+    CandleCache through cache_historical.
+    """
+    candles = cache_historical(
+        pairs, cache_root, period, start, end, max_workers, rate, offline
+    )
+    for pair, df in candles.items():
+        df.index = df.index.values.astype('datetime64[D]')
+        df.index.name = "time"
+        df.to_csv("%s.csv" % pair.replace("/",""))
 
 if __name__ == "__main__":
     # Trade on EUR/USD
@@ -0,0 +1,117 @@
+import calendar
+import datetime
+import numbers
+
+import numpy as np
+
+from event import BarEvent
+
+# Length in seconds of each timeframe bars can be built for
+TIMEFRAMES = {
+    "1s": 1, "5s": 5, "15s": 15, "1m": 60, "5m": 300, "15m": 900,
+    "30m": 1800, "1h": 3600, "4h": 14400, "1d": 86400
+}
+
+
+def tick_seconds(t):
+    """
+    Converts a tick time into float epoch seconds. Numbers above
+    1e11 are taken to be epoch milliseconds, as FXCM sends them;
+    datetimes without a timezone are taken to be UTC.
+    """
+    if isinstance(t, numbers.Real):
+        t = float(t)
+        return t / 1000.0 if t > 1e11 else t
+    if isinstance(t, datetime.datetime):
+        return calendar.timegm(t.utctimetuple()) + t.microsecond / 1e6
+    return np.datetime64(t, 'us').astype(np.int64) / 1e6
+
+
+class Bar(object):
+    """
+    Bar is the bar being built for one instrument and timeframe.
+    """
+    __slots__ = ('start', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, start, price):
+        self.start = start
+        self.open = price
+        self.high = price
+        self.low = price
+        self.close = price
+        self.volume = 1
+
+
+class BarAggregator(object):
+    """
+    BarAggregator builds OHLC bars over several timeframes from a
+    stream of TickEvents and puts a BarEvent on the events queue
+    for each bar as it completes. Each tick updates the open bar
+    of every timeframe in O(1).
+
+    Bars are aligned to multiples of their length in epoch time
+    and a bar completes when the first tick of a later bar
+    arrives, so the same ticks give the same bars live and in a
+    backtest. Bars with no ticks are not emitted. flush emits the
+    bars still open, e.g. at the end of a backtest.
+
+    Bars are built from the mid price by default, or from the bid
+    or ask if "price" is "bid" or "ask".
+    """
+    def __init__(self, events, timeframes=("1s", "1m", "1h"), price="mid"):
+        self.events = events
+        self.timeframes = [(tf, TIMEFRAMES[tf]) for tf in timeframes]
+        self.price = price
+        self.bars = {}
+        self.last_time = None
+        self.last_seconds = None
+
+    def tick_price(self, event):
+        if self.price == "bid":
+            return event.bid
+        if self.price == "ask":
+            return event.ask
+        return (event.bid + event.ask) / 2
+
+    def on_tick(self, event):
+        # Consecutive ticks often share a timestamp, so the last
+        # conversion is reused
+        if event.time != self.last_time:
+            self.last_time = event.time
+            self.last_seconds = tick_seconds(event.time)
+        seconds = self.last_seconds
+        price = self.tick_price(event)
+        bars = self.bars.get(event.instrument)
+        if bars is None:
+            bars = self.bars[event.instrument] = [None] * len(self.timeframes)
+        for i, (timeframe, length) in enumerate(self.timeframes):
+            start = int(seconds // length) * length
+            bar = bars[i]
+            if bar is None:
+                bars[i] = Bar(start, price)
+            elif start != bar.start:
+                self.emit(event.instrument, timeframe, bar)
+                bars[i] = Bar(start, price)
+            else:
+                if price > bar.high:
+                    bar.high = price
+                elif price < bar.low:
+                    bar.low = price
+                bar.close = price
+                bar.volume += 1
+
+    def emit(self, instrument, timeframe, bar):
+        self.events.put(BarEvent(
+            instrument, timeframe, bar.start, bar.open,
+            bar.high, bar.low, bar.close, bar.volume
+        ))
+
+    def flush(self):
+        """
+        Emits every open bar and starts afresh.
+        """
+        for instrument, bars in self.bars.items():
+            for (timeframe, length), bar in zip(self.timeframes, bars):
+                if bar is not None:
+                    self.emit(instrument, timeframe, bar)
+        self.bars = {}
@@ -0,0 +1,57 @@
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from backtest import Backtest
+from execution import SimulatedBroker, SimulatedExecution
+from portfolio import Portfolio
+from price import HistoricCSVPriceHandler
+from strategy import MovingAverageCrossStrategy
+from testdata import write_prices_csv
+
+
+def time_backtest(execution, execution_params=None, batch_size=0, repeats=3):
+    """
+    Returns the best of "repeats" wall clock times, in seconds, of
+    replaying EURUSD.csv in the current directory through an MA
+    5/20 cross backtest, together with the number of trades.
+    """
+    best = None
+    for _ in range(repeats):
+        backtest = Backtest(
+            ["EUR/USD"], HistoricCSVPriceHandler, MovingAverageCrossStrategy,
+            {"short_window": 5, "long_window": 20}, Portfolio, execution,
+            batch_size=batch_size, execution_params=execution_params
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            backtest._run_backtest()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(backtest.portfolio.trades)
+
+
+if __name__ == "__main__":
+    # Measure what filling orders through SimulatedBroker costs
+    # over the instant fills of SimulatedExecution, per tick and
+    # in batch mode
+    num_ticks = 60000
+    broker_params = {"latency_ms": 50.0}
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            write_prices_csv("EUR/USD", 0, num_ticks)
+            for name, batch_size in (("per tick", 0), ("batch", 10000)):
+                base, base_trades = time_backtest(SimulatedExecution, batch_size=batch_size)
+                broker, broker_trades = time_backtest(
+                    SimulatedBroker, broker_params, batch_size=batch_size
+                )
+                print("%-8s  instant fills %.3fs (%d trades)  broker %.3fs (%d trades)  cost %+.1f%%" % (
+                    name, base, base_trades, broker, broker_trades,
+                    100.0 * (broker - base) / base
+                ))
+        finally:
+            os.chdir(cwd)
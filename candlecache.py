@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+from downloader import CandleDownloader, DownloadManifest
+from pricestore import NumpyTickStore, to_epoch_seconds
+
+
+def merge_intervals(intervals):
+    """
+    Returns a sorted list of [start, end] intervals with the
+    overlapping and touching ones joined.
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def interval_gaps(intervals, start, end):
+    """
+    Returns the (start, end) parts of [start, end] that are not
+    covered by a sorted list of merged intervals.
+    """
+    gaps = []
+    cursor = start
+    for lo, hi in intervals:
+        if hi < cursor:
+            continue
+        if lo > end:
+            break
+        if lo > cursor:
+            gaps.append((cursor, lo))
+        cursor = max(cursor, hi)
+        if cursor >= end:
+            break
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class CandleCache(object):
+    """
+    CandleCache keeps historical candles on disk, one
+    NumpyTickStore per period under "root", together with an
+    index of the time intervals it holds for each (pair, period).
+    A request for a range downloads only the gaps in those
+    intervals, through a CandleDownloader, and serves the rest
+    from the store.
+
+    The network is only touched for a gap: "connect" is a
+    callable returning an authenticated RESTaccessor and is
+    called the first time one is needed. With "offline" set, or
+    without "connect", gaps are never filled and requests return
+    whatever the cache holds.
+
+    When the candles held exceed "max_bytes", the (pair, period)
+    entries used least recently are evicted until they fit again.
+    """
+    def __init__(
+        self, root="cache", connect=None, offline=False,
+        max_bytes=2 * 1024 ** 3, max_workers=4, rate=5.0
+    ):
+        self.root = root
+        self.connect = connect
+        self.offline = offline
+        self.max_bytes = max_bytes
+        self.max_workers = max_workers
+        self.rate = rate
+        self.RESTaccess = None
+        self.downloaders = {}
+        self.lock = threading.Lock()
+        self.index_path = os.path.join(root, "index.json")
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def key(pair, period):
+        return "%s|%s" % (pair, period)
+
+    def store(self, period):
+        return NumpyTickStore(os.path.join(self.root, period))
+
+    def save_index(self):
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+
+    def intervals(self, pair, period):
+        entry = self.index.get(self.key(pair, period))
+        return entry["intervals"] if entry else []
+
+    def total_bytes(self):
+        return sum(entry["bytes"] for entry in self.index.values())
+
+    def downloader(self, period):
+        if period not in self.downloaders:
+            if self.RESTaccess is None:
+                self.RESTaccess = self.connect()
+            self.downloaders[period] = CandleDownloader(
+                self.RESTaccess, os.path.join(self.root, period),
+                max_workers=self.max_workers, rate=self.rate
+            )
+        return self.downloaders[period]
+
+    def fill(self, pair, period, start, end):
+        """
+        Downloads the parts of [start, end] the cache does not
+        hold and adds them to its intervals. Returns the gaps that
+        are still missing.
+        """
+        gaps = interval_gaps(self.intervals(pair, period), start, end)
+        if not gaps or self.offline or self.connect is None:
+            return gaps
+        missing = []
+        downloader = self.downloader(period)
+        entry = self.index.setdefault(
+            self.key(pair, period), {"intervals": [], "bytes": 0, "last_used": 0.0}
+        )
+        for lo, hi in gaps:
+            if downloader.download([pair], lo, hi, period):
+                missing.append((lo, hi))
+            else:
+                entry["intervals"] = merge_intervals(entry["intervals"] + [[lo, hi]])
+        entry["bytes"] = self.pair_bytes(pair, period)
+        return missing
+
+    def pair_bytes(self, pair, period):
+        total = 0
+        for path, dirs, files in os.walk(self.store(period).pair_dir(pair)):
+            total += sum(os.path.getsize(os.path.join(path, f)) for f in files)
+        return total
+
+    def evict(self, keep):
+        """
+        Removes the least recently used entries, other than
+        "keep", until the cache fits within "max_bytes".
+        """
+        entries = sorted(self.index.items(), key=lambda item: item[1]["last_used"])
+        for key, entry in entries:
+            if self.total_bytes() <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            pair, period = key.split("|")
+            shutil.rmtree(self.store(period).pair_dir(pair), ignore_errors=True)
+            if period in self.downloaders:
+                manifest = self.downloaders[period].manifest
+            else:
+                manifest = DownloadManifest(os.path.join(self.root, period, "manifest.json"))
+            manifest.clear(pair, period)
+            del self.index[key]
+            self.logger.info("Evicted %s %s candles from the cache" % (pair, period))
+
+    def get(self, pair, period, start, end):
+        """
+        Returns a DataFrame of the candles of a pair over
+        [start, end], indexed by time, downloading whatever part
+        of the range is not cached unless offline.
+        """
+        start = to_epoch_seconds(start)
+        end = to_epoch_seconds(end)
+        with self.lock:
+            missing = self.fill(pair, period, start, end)
+            for lo, hi in missing:
+                self.logger.warning(
+                    "%s %s candles %s-%s are not cached" % (pair, period, lo, hi)
+                )
+            key = self.key(pair, period)
+            if key in self.index:
+                self.index[key]["last_used"] = time.time()
+                self.evict(key)
+                self.save_index()
+        return self.store(period).read(pair, start, end + 1)
@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import deque
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from event import TICK
+
+class ConflatingEventQueue(object):
+    """
+    ConflatingEventQueue can replace the events queue.Queue
+    between StreamingForexPrices and the dispatcher. It holds only
+    the latest TickEvent of each instrument: a tick that arrives
+    while an earlier tick of its instrument is still waiting
+    replaces it, so a consumer that falls behind during a burst
+    trades on the current quote rather than working through stale
+    ones, and the queue never holds more ticks than instruments.
+
+    Instruments with a waiting tick are marked dirty and handed out
+    in the order they became dirty. Every other event (signals,
+    orders, fills) is kept in FIFO order and handed out ahead of
+    ticks, so the consequences of one tick are handled before the
+    next. get and put follow the queue.Queue interface, with a
+    single lock guarding both.
+
+    Consumers that need every tick rather than the latest, such as
+    a BarAggregator building OHLC and volume, are added with
+    add_tick_listener and called with each tick as it is put,
+    before it can be conflated, on the thread putting it.
+
+    "received" counts the ticks put, "conflated" those replaced
+    before they were consumed and "delivered" those handed out.
+    """
+    def __init__(self):
+        self.latest = {}
+        self.dirty = deque()
+        self.other = deque()
+        self.cond = threading.Condition(threading.Lock())
+        self.received = 0
+        self.conflated = 0
+        self.delivered = 0
+        self.tick_listeners = []
+
+    def add_tick_listener(self, listener):
+        self.tick_listeners.append(listener)
+
+    def put(self, event, block=True, timeout=None):
+        # Listeners are called outside the lock, as they may put
+        # events of their own
+        if event.type_code == TICK:
+            for listener in self.tick_listeners:
+                listener(event)
+        with self.cond:
+            if event.type_code == TICK:
+                self.received += 1
+                instrument = event.instrument
+                if instrument in self.latest:
+                    self.conflated += 1
+                else:
+                    self.dirty.append(instrument)
+                self.latest[instrument] = event
+            else:
+                self.other.append(event)
+            self.cond.notify()
+
+    def put_nowait(self, event):
+        self.put(event, False)
+
+    def qsize(self):
+        with self.cond:
+            return len(self.other) + len(self.dirty)
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def pop(self):
+        if self.other:
+            return self.other.popleft()
+        instrument = self.dirty.popleft()
+        self.delivered += 1
+        return self.latest.pop(instrument)
+
+    def get(self, block=True, timeout=None):
+        with self.cond:
+            if not block:
+                if not self.other and not self.dirty:
+                    raise queue.Empty
+            elif timeout is None:
+                while not self.other and not self.dirty:
+                    self.cond.wait()
+            else:
+                deadline = time.monotonic() + timeout
+                while not self.other and not self.dirty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self.cond.wait(remaining)
+            return self.pop()
+
+    def get_nowait(self):
+        return self.get(False)
+
+    def stats(self):
+        """
+        Returns a dict of the tick counters and the number of
+        events currently waiting.
+        """
+        with self.cond:
+            return {
+                "received": self.received,
+                "conflated": self.conflated,
+                "delivered": self.delivered,
+                "pending_ticks": len(self.dirty),
+                "pending_events": len(self.other)
+            }
@@ -0,0 +1,153 @@
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+import logging
+import time
+
+from event import EVENT_CODES
+
+
+class EventDispatcher(object):
+    """
+    EventDispatcher pulls events off the events queue and hands
+    each one to the handlers registered for its type, looked up by
+    the event's integer type code. Rather than
+    polling the queue and sleeping for a fixed heartbeat, it blocks
+    on the queue until an event arrives (or the timeout expires)
+    and then drains everything that is pending in one batch.
+
+    The time spent in the handlers is recorded per event type so
+    that dispatch latency can be reported. Callbacks registered
+    with register_flush are run after each drained batch, which
+    lets components such as BatchExecution act on everything a
+    batch produced at once.
+
+    If a PipelineMonitor is given as "monitor", events must be
+    stamped (see event.enable_stamps): the time each event spent
+    on the queue is recorded as "queue_wait.<type>" and the time
+    spent in each handler under the stage it was registered with.
+    Without a monitor none of this is measured.
+    """
+    def __init__(self, events, timeout=0.5, monitor=None):
+        self.events = events
+        self.timeout = timeout
+        self.monitor = monitor
+        self.handlers = [None] * len(EVENT_CODES)
+        self.stages = [None] * len(EVENT_CODES)
+        self.flush_handlers = []
+        self.latency = {}
+        self.logger = logging.getLogger(__name__)
+
+    def register(self, event_type, handler, stage=None):
+        """
+        Adds a handler for the given event type. Handlers for the
+        same type are called in the order they were registered.
+        "stage" names the pipeline stage the handler's time is
+        recorded under when there is a monitor, and defaults to
+        the handler's qualified name.
+        """
+        code = EVENT_CODES[event_type]
+        if self.handlers[code] is None:
+            self.handlers[code] = []
+            self.stages[code] = []
+        if stage is None:
+            stage = getattr(handler, "__qualname__", repr(handler))
+        self.handlers[code].append(handler)
+        self.stages[code].append(stage)
+        self.latency.setdefault(event_type, [0, 0.0, 0.0])
+
+    def register_flush(self, handler, on_result=None):
+        """
+        Adds a callback that is run with no arguments after each
+        non-empty batch of events has been dispatched. If
+        "on_result" is given, it is called with whatever the
+        callback returns, e.g. the (event, status, response)
+        tuples of BatchExecution.flush.
+        """
+        self.flush_handlers.append((handler, on_result))
+
+    def flush(self):
+        for handler, on_result in self.flush_handlers:
+            result = handler()
+            if on_result is not None:
+                on_result(result)
+
+    def dispatch(self, event):
+        handlers = self.handlers[event.type_code]
+        if handlers is None:
+            return
+        start = time.perf_counter()
+        if self.monitor is None:
+            for handler in handlers:
+                handler(event)
+        else:
+            self.dispatch_monitored(event, handlers, start)
+        elapsed = time.perf_counter() - start
+        stats = self.latency[event.type]
+        stats[0] += 1
+        stats[1] += elapsed
+        if elapsed > stats[2]:
+            stats[2] = elapsed
+
+    def dispatch_monitored(self, event, handlers, start):
+        monitor = self.monitor
+        if event.created:
+            monitor.record("queue_wait." + event.type, start - event.created)
+        stages = self.stages[event.type_code]
+        for i, handler in enumerate(handlers):
+            t0 = time.perf_counter()
+            handler(event)
+            monitor.record(stages[i], time.perf_counter() - t0)
+
+    def drain(self, block=True):
+        """
+        Dispatches every event currently on the queue and returns
+        how many were handled. If "block" is True, waits up to
+        "timeout" seconds for the first event to arrive.
+        """
+        try:
+            event = self.events.get(block, self.timeout if block else None)
+        except queue.Empty:
+            return 0
+        count = 0
+        while True:
+            if event is not None:
+                self.dispatch(event)
+                count += 1
+            try:
+                event = self.events.get(False)
+            except queue.Empty:
+                self.flush()
+                return count
+
+    def run(self, report_interval=60.0):
+        """
+        Dispatches events forever, logging a latency summary, and
+        the queue's counters if it keeps any, every
+        "report_interval" seconds.
+        """
+        next_report = time.time() + report_interval
+        while True:
+            self.drain()
+            if time.time() >= next_report:
+                self.logger.info(self.latency_summary())
+                if hasattr(self.events, "stats"):
+                    self.logger.info("Events queue: %s" % self.events.stats())
+                next_report = time.time() + report_interval
+            if self.monitor is not None:
+                self.monitor.report()
+
+    def latency_summary(self):
+        """
+        Returns a one-line summary of the mean and maximum handler
+        latency, in microseconds, for each event type.
+        """
+        parts = []
+        for event_type in sorted(self.latency):
+            count, total, worst = self.latency[event_type]
+            mean = (total / count) if count else 0.0
+            parts.append("%s: n=%d mean=%.1fus max=%.1fus" % (
+                event_type, count, mean * 1e6, worst * 1e6
+            ))
+        return ", ".join(parts)
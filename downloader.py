@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from pricestore import NumpyTickStore, to_epoch_seconds
+
+# The columns of each candle returned by /candles, in order
+CANDLE_COLUMNS = [
+    "time", "bidopen", "bidclose", "bidhigh", "bidlow",
+    "askopen", "askclose", "askhigh", "asklow", "TickQty"
+]
+
+# Length in seconds of each candle period accepted by /candles
+PERIOD_SECONDS = {
+    "m1": 60, "m5": 300, "m15": 900, "m30": 1800,
+    "H1": 3600, "H2": 7200, "H3": 10800, "H4": 14400,
+    "H6": 21600, "H8": 28800, "D1": 86400, "W1": 604800
+}
+
+# FXCM offer IDs of the major pairs, used in the /candles path
+OFFER_IDS = {
+    "EUR/USD": 1, "USD/JPY": 2, "GBP/USD": 3, "USD/CHF": 4,
+    "EUR/CHF": 5, "AUD/USD": 6, "USD/CAD": 7, "NZD/USD": 8,
+    "EUR/GBP": 9, "EUR/JPY": 10, "GBP/JPY": 11, "CHF/JPY": 12
+}
+
+
+class RateLimiter(object):
+    """
+    RateLimiter spaces calls to wait out at least 1 / "rate"
+    seconds apart, across every thread that shares it.
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class DownloadManifest(object):
+    """
+    DownloadManifest records, in a JSON file, the (from, to) bounds
+    of every window that has been downloaded and stored for each
+    pair and period, so that an interrupted download can be
+    resumed. A window counts as done only if both bounds match, so
+    the last window of a range that is later extended is fetched
+    again in full. The file is rewritten atomically after each
+    window.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.done = dict(
+                    (k, set(tuple(w) for w in v)) for k, v in json.load(f).items()
+                )
+
+    @staticmethod
+    def key(pair, period):
+        return "%s|%s" % (pair, period)
+
+    def is_done(self, pair, period, window):
+        return tuple(window) in self.done.get(self.key(pair, period), ())
+
+    def mark_done(self, pair, period, window):
+        self.done.setdefault(self.key(pair, period), set()).add(tuple(window))
+        self.save()
+
+    def clear(self, pair, period):
+        if self.done.pop(self.key(pair, period), None) is not None:
+            self.save()
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(dict((k, [list(w) for w in sorted(v)]) for k, v in self.done.items()), f)
+        os.replace(tmp, self.path)
+
+
+class CandleDownloader(object):
+    """
+    CandleDownloader pulls historical candles for a date range
+    into a NumpyTickStore. The range is split into windows of at
+    most "max_candles" candles, the most /candles returns per
+    request, which are fetched by a pool of "max_workers" threads
+    while a shared RateLimiter keeps to "rate" requests a second.
+
+    Each window is written to the store as soon as it arrives,
+    from the calling thread, and then recorded in the manifest.
+    The store replaces candles with duplicate timestamps, so
+    windows that overlap at their edges, or that are fetched again
+    after an interruption, are deduplicated. Windows that fail are
+    left out of the manifest and are retried on the next run.
+    """
+    def __init__(
+        self, RESTaccess, store_root="store", manifest_path=None,
+        max_workers=4, rate=5.0, max_candles=10000, offer_ids=None
+    ):
+        self.RESTaccess = RESTaccess
+        self.store = NumpyTickStore(store_root)
+        if manifest_path is None:
+            manifest_path = os.path.join(store_root, "manifest.json")
+        self.manifest = DownloadManifest(manifest_path)
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(rate)
+        self.max_candles = max_candles
+        self.offer_ids = offer_ids or OFFER_IDS
+        self.logger = logging.getLogger(__name__)
+
+    def windows(self, start, end, period):
+        """
+        Returns the (from, to) epoch second bounds of the windows
+        covering [start, end].
+        """
+        start = to_epoch_seconds(start)
+        end = to_epoch_seconds(end)
+        span = PERIOD_SECONDS[period] * self.max_candles
+        return [(lo, min(lo + span, end)) for lo in range(start, end, span)]
+
+    def fetch_window(self, pair, period, window):
+        """
+        Requests the candles of one window and returns them as a
+        DataFrame, or None if the request failed.
+        """
+        self.limiter.wait()
+        method = "/candles/%d/%s" % (self.offer_ids[pair], period)
+        status, response = self.RESTaccess.request_processor(method, {
+            "num": self.max_candles,
+            "from": window[0],
+            "to": window[1]
+        })
+        if status is not True:
+            self.logger.error("Error processing request: %s %s: %s" % (method, window, response))
+            return None
+        return pd.DataFrame(response["candles"], columns=CANDLE_COLUMNS)
+
+    def download(self, pairs, start, end, period="H1"):
+        """
+        Downloads every window of [start, end] for each pair that
+        the manifest does not already hold, and returns the list
+        of (pair, window) that failed.
+        """
+        jobs = [
+            (pair, window) for pair in pairs
+            for window in self.windows(start, end, period)
+            if not self.manifest.is_done(pair, period, window)
+        ]
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = dict(
+                (pool.submit(self.fetch_window, pair, period, window), (pair, window))
+                for pair, window in jobs
+            )
+            for future in as_completed(futures):
+                pair, window = futures[future]
+                try:
+                    df = future.result()
+                except Exception:
+                    self.logger.exception("Downloading %s %s failed" % (pair, window))
+                    df = None
+                if df is None:
+                    failed.append((pair, window))
+                    continue
+                if len(df):
+                    df = df.drop_duplicates("time", keep="last")
+                    self.store.write(pair, df)
+                self.manifest.mark_done(pair, period, window)
+        return failed
@@ -1,14 +1,57 @@
+import contextlib
+import time
+
+import numpy as np
+
+# Integer type codes, so that consumers can dispatch on an index
+# rather than comparing strings
+TICK, SIGNAL, ORDER, FILL, BAR = range(5)
+EVENT_CODES = {'TICK': TICK, 'SIGNAL': SIGNAL, 'ORDER': ORDER, 'FILL': FILL, 'BAR': BAR}
+
+# When enabled, every event records the monotonic clock reading at
+# which it was created in its "created" slot, for latency tracing.
+# Otherwise "created" is 0.0 and no clock is read.
+STAMP_EVENTS = False
+clock = time.perf_counter
+
+
+def enable_stamps(enabled=True):
+    global STAMP_EVENTS
+    STAMP_EVENTS = enabled
+
+
+@contextlib.contextmanager
+def stamping(enabled=True):
+    """
+    Stamps events for the duration of a with block and then
+    restores the previous setting, so that a monitored run does
+    not leave every later run in the process reading the clock.
+    If "enabled" is False the setting is left as it is.
+    """
+    previous = STAMP_EVENTS
+    if enabled:
+        enable_stamps()
+    try:
+        yield
+    finally:
+        enable_stamps(previous)
+
+
 class Event(object):
-    pass
+    __slots__ = ()
 
 
 class TickEvent(Event):
+    __slots__ = ('instrument', 'time', 'bid', 'ask', 'created')
+    type = 'TICK'
+    type_code = TICK
+
     def __init__(self, instrument, time, bid, ask):
-        self.type = 'TICK'
         self.instrument = instrument
         self.time = time
         self.bid = bid
         self.ask = ask
+        self.created = clock() if STAMP_EVENTS else 0.0
 
     def __str__(self):
         return "Type: %s, Instrument: %s, Time: %s, Bid: %s, Ask: %s" % (
@@ -21,12 +64,16 @@ class TickEvent(Event):
 
 
 class SignalEvent(Event):
+    __slots__ = ('instrument', 'order_type', 'side', 'time', 'created')
+    type = 'SIGNAL'
+    type_code = SIGNAL
+
     def __init__(self, instrument, order_type, side, time):
-        self.type = 'SIGNAL'
         self.instrument = instrument
         self.order_type = order_type
         self.side = side
         self.time = time
+        self.created = clock() if STAMP_EVENTS else 0.0
 
     def __str__(self):
         return "Type: %s, Instrument: %s, Order Type: %s, Side: %s" % (
@@ -39,12 +86,17 @@ class SignalEvent(Event):
 
 
 class OrderEvent(Event):
-    def __init__(self, instrument, units, order_type, side):
-        self.type = 'ORDER'
+    __slots__ = ('instrument', 'units', 'order_type', 'side', 'price', 'created')
+    type = 'ORDER'
+    type_code = ORDER
+
+    def __init__(self, instrument, units, order_type, side, price=None):
         self.instrument = instrument
         self.units = units
         self.order_type = order_type
         self.side = side
+        self.price = price
+        self.created = clock() if STAMP_EVENTS else 0.0
 
     def __str__(self):
         return "Type: %s, Instrument: %s, Units: %s, Order Type: %s, Side: %s" % (
@@ -53,4 +105,117 @@ class OrderEvent(Event):
         )
 
     def __repr__(self):
-        return str(self)
\ No newline at end of file
+        return str(self)
+
+
+class FillEvent(Event):
+    __slots__ = ('instrument', 'units', 'side', 'price', 'time', 'order', 'created')
+    type = 'FILL'
+    type_code = FILL
+
+    def __init__(self, instrument, units, side, price, time, order):
+        self.instrument = instrument
+        self.units = units
+        self.side = side
+        self.price = price
+        self.time = time
+        self.order = order
+        self.created = clock() if STAMP_EVENTS else 0.0
+
+    def __str__(self):
+        return "Type: %s, Instrument: %s, Units: %s, Side: %s, Price: %s, Time: %s" % (
+            str(self.type), str(self.instrument), str(self.units),
+            str(self.side), str(self.price), str(self.time)
+        )
+
+    def __repr__(self):
+        return str(self)
+
+
+class BarEvent(Event):
+    """
+    BarEvent carries a completed OHLC bar of an instrument over
+    one timeframe. "time" is the start of the bar in epoch seconds
+    and "volume" the number of ticks it was built from.
+    """
+    __slots__ = ('instrument', 'timeframe', 'time', 'open', 'high', 'low',
+                 'close', 'volume', 'created')
+    type = 'BAR'
+    type_code = BAR
+
+    def __init__(self, instrument, timeframe, time, open, high, low, close, volume):
+        self.instrument = instrument
+        self.timeframe = timeframe
+        self.time = time
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.created = clock() if STAMP_EVENTS else 0.0
+
+    def __str__(self):
+        return "Type: %s, Instrument: %s, Timeframe: %s, Time: %s, O: %s, H: %s, L: %s, C: %s, V: %s" % (
+            str(self.type), str(self.instrument), str(self.timeframe), str(self.time),
+            str(self.open), str(self.high), str(self.low), str(self.close), str(self.volume)
+        )
+
+    def __repr__(self):
+        return str(self)
+
+
+class TickEventPool(object):
+    """
+    TickEventPool recycles TickEvent objects so that a long replay
+    does not allocate one per tick. A consumer must release an
+    event once nothing holds a reference to it any more; in the
+    backtester this is done by registering release as the last
+    TICK handler.
+    """
+    def __init__(self):
+        self.free = []
+
+    def acquire(self, instrument, time, bid, ask):
+        if self.free:
+            tev = self.free.pop()
+            tev.instrument = instrument
+            tev.time = time
+            tev.bid = bid
+            tev.ask = ask
+            tev.created = clock() if STAMP_EVENTS else 0.0
+            return tev
+        return TickEvent(instrument, time, bid, ask)
+
+    def release(self, tev):
+        self.free.append(tev)
+
+
+class TickBatch(object):
+    """
+    TickBatch holds a block of consecutive ticks as NumPy arrays
+    of time, bid and ask, with the instrument of every row, so that
+    they can be processed in bulk instead of one TickEvent at a
+    time. Prices are float64. "time_ns" optionally holds the times
+    as int64 epoch nanoseconds.
+    """
+    __slots__ = ('instruments', 'time', 'bid', 'ask', 'time_ns')
+
+    def __init__(self, instruments, time, bid, ask, time_ns=None):
+        self.instruments = np.asarray(instruments, dtype=object)
+        self.time = np.asarray(time)
+        self.bid = np.asarray(bid, dtype=np.float64)
+        self.ask = np.asarray(ask, dtype=np.float64)
+        self.time_ns = None if time_ns is None else np.asarray(time_ns, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.bid)
+
+    def tick(self, i):
+        """
+        Returns row "i" of the batch as a TickEvent.
+        """
+        return TickEvent(self.instruments[i], self.time[i], self.bid[i], self.ask[i])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.tick(i)
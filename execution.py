@@ -1,18 +1,155 @@
+import heapq
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from event import FillEvent
 
 class SimulatedExecution(object):
     def execute_order(self, event):
         pass
 
+
+def time_to_ns(t):
+    """
+    Converts a tick time, either epoch seconds or anything numpy
+    can parse as a datetime, into integer epoch nanoseconds.
+    """
+    if isinstance(t, (int, float, np.integer, np.floating)):
+        return int(t * 1e9)
+    return int(np.datetime64(t, 'ns').astype(np.int64))
+
+
+class SimulatedOrder(object):
+    __slots__ = ('event', 'remaining', 'active_ns')
+
+    def __init__(self, event, active_ns):
+        self.event = event
+        self.remaining = event.units
+        self.active_ns = active_ns
+
+
+class SimulatedBroker(object):
+    """
+    SimulatedBroker fills orders against the backtest price stream
+    instead of at the quote on which they were raised.
+
+    - Latency: an order becomes live "latency_ms" after the time of
+      the tick it was sent on, and is first tried on the next tick
+      of its pair at or after that time.
+    - Spread and slippage: buys fill at the mid plus
+      "spread_multiplier" times the quoted half-spread plus
+      "slippage" in price units, and sells at the mirror image.
+    - Partial fills: at most "max_fill_units" of an order fill on
+      any one tick; the rest waits for the following ticks.
+    - Limit orders: an OrderEvent with order_type "Limit" and a
+      price only fills when the effective price is at or better
+      than its limit.
+
+    Each fill is put on the events queue as a FillEvent. Orders
+    waiting out their latency sit in a heap keyed on the time they
+    become live, so a tick only looks at orders that are due and
+    costs nothing when no orders are outstanding.
+    """
+    fills_orders = True
+
+    def __init__(
+        self, latency_ms=0.0, spread_multiplier=1.0, slippage=0.0,
+        max_fill_units=None
+    ):
+        self.latency_ns = int(latency_ms * 1e6)
+        self.spread_multiplier = spread_multiplier
+        self.slippage = slippage
+        self.max_fill_units = max_fill_units
+        self.events = None
+        self.ticker = None
+        self.pending = []
+        self.active = {}
+        self.seq = 0
+        self.last_time = None
+        self.last_ns = 0
+        self.logger = logging.getLogger(__name__)
+
+    def attach(self, events, ticker):
+        self.events = events
+        self.ticker = ticker
+
+    def tick_ns(self, price):
+        """
+        Returns the time of a pair's current price in epoch
+        nanoseconds, as converted by the price handler if it did.
+        """
+        time_ns = price.get("time_ns")
+        if time_ns is None:
+            return time_to_ns(price["time"])
+        return time_ns
+
+    def execute_order(self, event):
+        now = self.tick_ns(self.ticker.prices[event.instrument])
+        order = SimulatedOrder(event, now + self.latency_ns)
+        heapq.heappush(self.pending, (order.active_ns, self.seq, order))
+        self.seq += 1
+
+    def fill_price(self, side, bid, ask):
+        mid = (bid + ask) / 2.0
+        half_spread = (ask - bid) / 2.0 * self.spread_multiplier
+        if side == "true":
+            return mid + half_spread + self.slippage
+        return mid - half_spread - self.slippage
+
+    def on_tick(self, tick_event):
+        if not self.pending and not self.active:
+            return
+        pair = tick_event.instrument
+        if tick_event.time != self.last_time:
+            self.last_time = tick_event.time
+            self.last_ns = self.tick_ns(self.ticker.prices[pair])
+        now = self.last_ns
+        pending = self.pending
+        while pending and pending[0][0] <= now:
+            order = heapq.heappop(pending)[2]
+            self.active.setdefault(order.event.instrument, []).append(order)
+        orders = self.active.get(pair)
+        if not orders:
+            return
+        bid = float(tick_event.bid)
+        ask = float(tick_event.ask)
+        waiting = []
+        for order in orders:
+            if not self.try_fill(order, bid, ask, tick_event.time):
+                waiting.append(order)
+        if waiting:
+            self.active[pair] = waiting
+        else:
+            del self.active[pair]
+
+    def try_fill(self, order, bid, ask, time):
+        """
+        Fills as much of an order as the tick allows and returns
+        True once it is completely filled.
+        """
+        event = order.event
+        price = round(self.fill_price(event.side, bid, ask), 5)
+        if event.order_type == "Limit" and event.price is not None:
+            if event.side == "true" and price > event.price:
+                return False
+            if event.side == "false" and price < event.price:
+                return False
+        units = order.remaining
+        if self.max_fill_units is not None:
+            units = min(units, self.max_fill_units)
+        order.remaining -= units
+        self.events.put(FillEvent(event.instrument, units, event.side, price, time, event))
+        return order.remaining <= 0
+
 class Execution(object):
     def __init__(self, RESTaccess):
         self.RESTaccess = RESTaccess
         self.logger = logging.getLogger(__name__)
 
-    def execute_order(self, event):
-        #below is a debugger print statement so you can display the basic info of the order
-        #print("start order execution " + str(event.instrument) + " " + str(event.units) + " " + str(event.side))
-        status, response = self.RESTaccess.post_request_processor('/trading/open_trade', {
+    def order_params(self, event):
+        return {
             'account_id': self.RESTaccess.ACCOUNT_ID,
             'symbol': event.instrument,
             'is_buy': event.side,
@@ -21,8 +158,68 @@ class Execution(object):
             'at_market': 0,
             'order_type': event.order_type,
             'time_in_force': 'GTC'
-        })
+        }
+
+    def submit_order(self, event):
+        status, response = self.RESTaccess.post_request_processor(
+            '/trading/open_trade', self.order_params(event)
+        )
         if status is True:
             print('Order has been executed: {}'.format(response))
         else:
-            print('Order execution error: {}'.format(response))
\ No newline at end of file
+            print('Order execution error: {}'.format(response))
+        return status, response
+
+    def execute_order(self, event):
+        #below is a debugger print statement so you can display the basic info of the order
+        #print("start order execution " + str(event.instrument) + " " + str(event.units) + " " + str(event.side))
+        return self.submit_order(event)
+
+class BatchExecution(Execution):
+    """
+    BatchExecution collects the orders produced during one
+    dispatch cycle and submits them together when flush() is
+    called, rather than making one blocking request per order as
+    it arrives. FXCM has no bulk order endpoint, so the batch is
+    sent concurrently over the RESTaccessor's connection pool, one
+    instrument per worker: the orders of an instrument are sent
+    one after another, in the order they were received, so a
+    close never reaches the broker ahead of its open.
+    """
+    def __init__(self, RESTaccess, max_workers=None):
+        super(BatchExecution, self).__init__(RESTaccess)
+        self.max_workers = max_workers or RESTaccess.pool_size
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.pending = []
+
+    def execute_order(self, event):
+        self.pending.append(event)
+
+    def submit_orders(self, orders):
+        return [self.submit_order(event) for event in orders]
+
+    def flush(self):
+        """
+        Submits every pending order and returns a list of
+        (event, status, response) tuples, one per order, in the
+        order the events were received.
+        """
+        if not self.pending:
+            return []
+        orders, self.pending = self.pending, []
+        groups = {}
+        for i, event in enumerate(orders):
+            groups.setdefault(event.instrument, []).append(i)
+        indices = list(groups.values())
+        results = [None] * len(orders)
+        for group, group_results in zip(indices, self.pool.map(
+            self.submit_orders, [[orders[i] for i in group] for group in indices]
+        )):
+            for i, result in zip(group, group_results):
+                results[i] = result
+        fills = []
+        for event, (status, response) in zip(orders, results):
+            if status is not True:
+                self.logger.error("Order %s failed: %s" % (event, response))
+            fills.append((event, status, response))
+        return fills
@@ -0,0 +1,271 @@
+import math
+from collections import deque
+
+import numpy as np
+
+
+class RollingSMA(object):
+    """
+    RollingSMA is the simple moving average of the last "window"
+    values, kept in a fixed-size ring buffer with a running sum so
+    that each update is O(1). Until the window has filled it
+    averages the values seen so far, as pandas rolling(window,
+    min_periods=1).mean() does.
+    """
+    def __init__(self, window):
+        self.window = window
+        self.buffer = [0] * window
+        self.indx = 0
+        self.count = 0
+        self.total = 0
+        self.value = None
+
+    @property
+    def ready(self):
+        return self.count >= self.window
+
+    def update(self, x):
+        if self.count < self.window:
+            self.count += 1
+        else:
+            self.total -= self.buffer[self.indx]
+        self.buffer[self.indx] = x
+        self.total += x
+        self.indx = (self.indx + 1) % self.window
+        self.value = self.total / self.count
+        return self.value
+
+    def history(self):
+        """
+        Returns the values currently in the window, oldest first.
+        """
+        if self.count < self.window:
+            return self.buffer[:self.count]
+        return self.buffer[self.indx:] + self.buffer[:self.indx]
+
+    def extend(self, values):
+        """
+        Updates the average with a sequence of values at once.
+        """
+        values = list(values)
+        if not values:
+            return self.value
+        tail = (self.history() + values)[-self.window:]
+        self.count = len(tail)
+        self.buffer = tail + [0] * (self.window - self.count)
+        self.indx = self.count % self.window
+        self.total = sum(tail)
+        self.value = self.total / self.count
+        return self.value
+
+
+class EMA(object):
+    """
+    EMA is the exponential moving average with smoothing factor
+    2 / (window + 1), seeded with the first value. It matches
+    pandas ewm(span=window, adjust=False).mean().
+    """
+    def __init__(self, window):
+        self.window = window
+        self.alpha = 2.0 / (window + 1)
+        self.count = 0
+        self.value = None
+
+    @property
+    def ready(self):
+        return self.count >= self.window
+
+    def update(self, x):
+        self.count += 1
+        if self.value is None:
+            self.value = x
+        else:
+            self.value = self.value + self.alpha * (x - self.value)
+        return self.value
+
+
+class RollingStd(object):
+    """
+    RollingStd is the standard deviation of the last "window"
+    values, kept in a ring buffer with a running mean and sum of
+    squared deviations updated by Welford's method, which does not
+    lose precision to cancellation as a running sum of squares
+    does. Both are recomputed from the buffer once every "window"
+    updates, so rounding cannot accumulate, and a window of equal
+    values has a deviation of exactly zero. It matches pandas
+    rolling(window).std(ddof) once at least ddof + 1 values have
+    been seen, and is None before that.
+    """
+    def __init__(self, window, ddof=1):
+        self.window = window
+        self.ddof = ddof
+        self.buffer = [0.0] * window
+        self.indx = 0
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.updates = 0
+        self.run = 0
+        self.value = None
+
+    @property
+    def ready(self):
+        return self.count >= self.window
+
+    def recompute(self):
+        n = self.count
+        values = self.buffer[:n]
+        self.mean = math.fsum(values) / n
+        self.m2 = math.fsum((v - self.mean) ** 2 for v in values)
+
+    def update(self, x):
+        x = float(x)
+        last = self.buffer[self.indx - 1] if self.count else None
+        self.run = self.run + 1 if x == last else 1
+        if self.count < self.window:
+            self.count += 1
+            delta = x - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (x - self.mean)
+        else:
+            old = self.buffer[self.indx]
+            old_mean = self.mean
+            self.mean += (x - old) / self.count
+            self.m2 += (x - old) * (x - self.mean + old - old_mean)
+        self.buffer[self.indx] = x
+        self.indx = (self.indx + 1) % self.window
+        self.updates += 1
+        if self.updates % self.window == 0:
+            self.recompute()
+        n = self.count
+        if n <= self.ddof:
+            self.value = None
+        elif self.run >= n:
+            self.value = 0.0
+        else:
+            var = self.m2 / (n - self.ddof)
+            self.value = math.sqrt(var) if var > 0.0 else 0.0
+        return self.value
+
+
+class BollingerBands(object):
+    """
+    BollingerBands holds a RollingSMA and a RollingStd over the
+    same window. update returns (lower, middle, upper), where the
+    bands sit "num_std" standard deviations either side of the
+    average, or None until the deviation is defined.
+    """
+    def __init__(self, window, num_std=2.0):
+        self.window = window
+        self.num_std = num_std
+        self.sma = RollingSMA(window)
+        self.std = RollingStd(window)
+        self.value = None
+
+    @property
+    def ready(self):
+        return self.sma.ready
+
+    def update(self, x):
+        mid = float(self.sma.update(x))
+        std = self.std.update(x)
+        if std is None:
+            self.value = None
+        else:
+            self.value = (mid - self.num_std * std, mid, mid + self.num_std * std)
+        return self.value
+
+
+class ATR(object):
+    """
+    ATR is the average true range over "window" bars. The true
+    range of a bar is the largest of high - low and the distances
+    from the previous close to the high and low; the first bar
+    uses high - low. The ranges are averaged with a RollingSMA.
+    """
+    def __init__(self, window):
+        self.window = window
+        self.sma = RollingSMA(window)
+        self.prev_close = None
+        self.value = None
+
+    @property
+    def ready(self):
+        return self.sma.ready
+
+    def update(self, high, low, close):
+        if self.prev_close is None:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+        self.value = self.sma.update(tr)
+        return self.value
+
+
+class RollingMax(object):
+    """
+    RollingMax is the maximum of the last "window" values. It keeps
+    a deque of (index, value) pairs with decreasing values, so each
+    update is amortised O(1) and the deque never holds more than
+    "window" entries.
+    """
+    def __init__(self, window):
+        self.window = window
+        self.entries = deque()
+        self.count = 0
+        self.value = None
+
+    @property
+    def ready(self):
+        return self.count >= self.window
+
+    def better(self, a, b):
+        return a >= b
+
+    def update(self, x):
+        entries = self.entries
+        while entries and self.better(x, entries[-1][1]):
+            entries.pop()
+        entries.append((self.count, x))
+        if entries[0][0] <= self.count - self.window:
+            entries.popleft()
+        self.count += 1
+        self.value = entries[0][1]
+        return self.value
+
+
+class RollingMin(RollingMax):
+    """
+    RollingMin is the minimum of the last "window" values, kept in
+    a deque of increasing values.
+    """
+    def better(self, a, b):
+        return a <= b
+
+
+def rolling_sums(history, values, window):
+    """
+    Returns the sum and count of the last "window" integers after
+    each of an array of integer values, continuing from "history",
+    the values already in the window, as RollingSMA would hold
+    them. Counts are below "window" until it has filled. The sums
+    are exact, so averages compared through compare_averages tie
+    exactly when RollingSMA's Decimal averages do.
+    """
+    data = np.concatenate((
+        np.asarray(history, dtype=np.int64), np.asarray(values, dtype=np.int64)
+    ))
+    cumsum = np.concatenate(([0], np.cumsum(data)))
+    ends = np.arange(len(history) + 1, len(data) + 1)
+    starts = np.maximum(ends - window, 0)
+    return cumsum[ends] - cumsum[starts], ends - starts
+
+
+def compare_averages(sums_a, counts_a, sums_b, counts_b):
+    """
+    Returns -1, 0 or 1 for each element as the average
+    sums_a / counts_a is below, equal to or above sums_b / counts_b,
+    comparing by cross-multiplication without any rounding.
+    """
+    return np.sign(sums_a * counts_b - sums_b * counts_a)
@@ -0,0 +1,181 @@
+import logging
+import threading
+import time
+
+
+class LatencyHistogram(object):
+    """
+    LatencyHistogram records durations into log-linear buckets in
+    the style of an HDR histogram. Values are held in microseconds;
+    each power-of-two range is split into 2**sub_bucket_bits
+    buckets, so every recorded value is kept to within a relative
+    error of 1 / 2**sub_bucket_bits whatever its magnitude.
+    Recording is O(1) and memory grows only with the number of
+    distinct buckets hit. A lock makes it safe to record from
+    several threads, e.g. a BatchExecution's worker pool.
+    """
+    def __init__(self, sub_bucket_bits=5):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.lock = threading.Lock()
+
+    def bucket_index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits - 1
+        return ((shift + 1) << self.sub_bucket_bits) + (value >> shift) - self.sub_bucket_count
+
+    def bucket_value(self, index):
+        """
+        Returns the lowest value, in microseconds, held by a bucket.
+        """
+        if index < self.sub_bucket_count:
+            return index
+        shift = (index >> self.sub_bucket_bits) - 1
+        sub = (index & (self.sub_bucket_count - 1)) + self.sub_bucket_count
+        return sub << shift
+
+    def record(self, seconds):
+        """
+        Records a duration given in seconds.
+        """
+        value = int(seconds * 1e6)
+        if value < 0:
+            value = 0
+        index = self.bucket_index(value)
+        with self.lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.count += 1
+            self.total += seconds
+            if self.min is None or seconds < self.min:
+                self.min = seconds
+            if self.max is None or seconds > self.max:
+                self.max = seconds
+
+    def merge(self, other):
+        with other.lock:
+            counts = list(other.counts.items())
+            count, total = other.count, other.total
+            other_min, other_max = other.min, other.max
+        with self.lock:
+            for index, n in counts:
+                self.counts[index] = self.counts.get(index, 0) + n
+            self.count += count
+            self.total += total
+            if other_min is not None and (self.min is None or other_min < self.min):
+                self.min = other_min
+            if other_max is not None and (self.max is None or other_max > self.max):
+                self.max = other_max
+
+    def percentile(self, p):
+        """
+        Returns the duration in seconds at or below which "p"
+        percent of the recorded values fall.
+        """
+        with self.lock:
+            counts = sorted(self.counts.items())
+            count, max_ = self.count, self.max
+        if count == 0:
+            return 0.0
+        target = count * p / 100.0
+        seen = 0
+        for index, n in counts:
+            seen += n
+            if seen >= target:
+                return self.bucket_value(index) / 1e6
+        return max_
+
+    def summary(self):
+        """
+        Returns a dict of the count, mean, min, max and the 50th,
+        90th and 99th percentiles, with durations in seconds.
+        """
+        with self.lock:
+            count, total, min_, max_ = self.count, self.total, self.min, self.max
+        return {
+            "count": count,
+            "mean": (total / count) if count else 0.0,
+            "min": min_ or 0.0,
+            "max": max_ or 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99)
+        }
+
+
+class PipelineMonitor(object):
+    """
+    PipelineMonitor keeps a LatencyHistogram per stage of the
+    tick -> signal -> order pipeline, such as "queue_wait",
+    "strategy", "portfolio" and "rest". Stages are created the
+    first time they are recorded, and the histograms of other
+    components (for example RESTaccessor.latency) can be attached
+    with add_source so that they appear in the same summary.
+
+    report is called from the event loop and, at most once every
+    "report_interval" seconds, logs the summary and passes it to
+    "exporter", a callable taking the summary dict, if one is given.
+    """
+    def __init__(self, report_interval=60.0, exporter=None):
+        self.report_interval = report_interval
+        self.exporter = exporter
+        self.stages = {}
+        self.sources = {}
+        self.next_report = time.time() + report_interval
+        self.logger = logging.getLogger(__name__)
+
+    def record(self, stage, seconds):
+        hist = self.stages.get(stage)
+        if hist is None:
+            hist = self.stages[stage] = LatencyHistogram()
+        hist.record(seconds)
+
+    def add_source(self, prefix, histograms):
+        """
+        Includes a dict of name -> LatencyHistogram, owned and
+        updated by another component, in the summary under
+        "prefix.name".
+        """
+        self.sources[prefix] = histograms
+
+    def histograms(self):
+        hists = dict(self.stages)
+        for prefix, source in self.sources.items():
+            for name, hist in source.items():
+                hists["%s.%s" % (prefix, name)] = hist
+        return hists
+
+    def summary(self):
+        """
+        Returns a dict of stage -> LatencyHistogram.summary().
+        """
+        return dict(
+            (stage, hist.summary()) for stage, hist in self.histograms().items()
+        )
+
+    def format_summary(self):
+        parts = []
+        for stage, stats in sorted(self.summary().items()):
+            parts.append("%s: n=%d p50=%.1fus p99=%.1fus max=%.1fus" % (
+                stage, stats["count"], stats["p50"] * 1e6,
+                stats["p99"] * 1e6, stats["max"] * 1e6
+            ))
+        return ", ".join(parts)
+
+    def report(self, force=False):
+        """
+        Logs and exports the summary if "report_interval" seconds
+        have passed since the last report, or if "force" is True.
+        """
+        now = time.time()
+        if not force and now < self.next_report:
+            return
+        self.next_report = now + self.report_interval
+        self.logger.info(self.format_summary())
+        if self.exporter is not None:
+            self.exporter(self.summary())
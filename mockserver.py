@@ -0,0 +1,120 @@
+import asyncio
+import random
+import time
+from aiohttp import web
+
+from event import TickEvent
+
+
+class MockFXCMServer(object):
+    """
+    MockFXCMServer is a local stand-in for the FXCM REST API that
+    answers /subscribe, /trading/open_trade and /candles requests
+    with responses of the same shape as the real server. Every
+    order it receives is kept in "orders", and "order_latency"
+    seconds of delay can be added to each order to mimic the
+    broker round-trip. With "port" 0 the server listens on a free
+    port, which "port" and "url" hold once it has started.
+    """
+    def __init__(self, host="127.0.0.1", port=8089, order_latency=0.0):
+        self.host = host
+        self.port = port
+        self.order_latency = order_latency
+        self.url = "http://%s:%d" % (host, port)
+        self.orders = []
+        self.subscriptions = []
+        self.runner = None
+
+    def create_app(self):
+        app = web.Application()
+        app.router.add_post('/subscribe', self.subscribe)
+        app.router.add_post('/trading/open_trade', self.open_trade)
+        app.router.add_get('/candles/{offer_id}/{period}', self.candles)
+        return app
+
+    async def start(self):
+        self.runner = web.AppRunner(self.create_app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        if self.port == 0:
+            self.port = self.runner.addresses[0][1]
+            self.url = "http://%s:%d" % (self.host, self.port)
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def subscribe(self, request):
+        data = await request.post()
+        pairs = data.getall('pairs', [])
+        self.subscriptions.extend(pairs)
+        return web.json_response({
+            "response": {"executed": True},
+            "pairs": [{"Symbol": p, "Rates": [1.1, 1.1001]} for p in pairs]
+        })
+
+    async def open_trade(self, request):
+        data = await request.post()
+        if self.order_latency:
+            await asyncio.sleep(self.order_latency)
+        self.orders.append(dict(data))
+        return web.json_response({
+            "response": {"executed": True},
+            "data": {"type": 0, "orderId": len(self.orders)}
+        })
+
+    async def candles(self, request):
+        num = int(request.query.get('num', 10))
+        start = int(request.query.get('from', 0))
+        candles = [
+            [start + 3600 * i] + [1.1] * 8 + [100] for i in range(num)
+        ]
+        return web.json_response({
+            "response": {"executed": True},
+            "candles": candles
+        })
+
+
+class SimulatedPriceStream(object):
+    """
+    SimulatedPriceStream produces random-walk bid/ask ticks for a
+    list of instruments. It keeps a "prices" dict in the same form
+    as StreamingForexPrices, so it can be given to a Portfolio as
+    its ticker.
+    """
+    def __init__(
+        self, instruments, num_ticks=1000, interval=0.0,
+        start_price=1.1, spread=0.0002, volatility=0.0001, seed=None
+    ):
+        self.instruments = instruments
+        self.num_ticks = num_ticks
+        self.interval = interval
+        self.spread = spread
+        self.volatility = volatility
+        self.rng = random.Random(seed)
+        self.mid = dict((p, start_price) for p in instruments)
+        self.prices = dict(
+            (p, {"bid": None, "ask": None, "time": None}) for p in instruments
+        )
+
+    def next_tick(self):
+        symbol = self.rng.choice(self.instruments)
+        self.mid[symbol] += self.rng.gauss(0.0, self.volatility)
+        bid = round(self.mid[symbol] - self.spread / 2, 5)
+        ask = round(self.mid[symbol] + self.spread / 2, 5)
+        now = time.time()
+        self.prices[symbol]["bid"] = bid
+        self.prices[symbol]["ask"] = ask
+        self.prices[symbol]["time"] = now
+        return TickEvent(symbol, now, bid, ask)
+
+    async def stream(self, events):
+        """
+        Puts "num_ticks" ticks onto the events queue, pausing
+        "interval" seconds between them.
+        """
+        for i in range(self.num_ticks):
+            events.put(self.next_tick())
+            await asyncio.sleep(self.interval)
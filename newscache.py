@@ -0,0 +1,160 @@
+import logging
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+
+
+def same_event(a, b):
+    """
+    Returns True if two events hold the same columns and values,
+    taking missing values, e.g. an actual figure not yet
+    published, as equal to each other.
+    """
+    if a.keys() != b.keys():
+        return False
+    for k, v in a.items():
+        w = b[k]
+        if not (v == w or (v != v and w != w)):
+            return False
+    return True
+
+
+class FileCalendarSource(object):
+    """
+    FileCalendarSource reads economic calendar events from a CSV
+    file, so that news strategies can be run offline against a
+    fixture. The file needs at least "currency", "actual" and
+    "previous" columns; it is re-read on every fetch so events
+    appended to it show up on the next refresh.
+    """
+    def __init__(self, filename, index_col=0):
+        self.filename = filename
+        self.index_col = index_col
+
+    def fetch(self):
+        return pd.read_csv(self.filename, index_col=self.index_col)
+
+
+class FXCMCalendarSource(object):
+    """
+    FXCMCalendarSource fetches the calendar through an FXCMEconCal
+    object, whose createNewsData method returns a new FXCMEconCal
+    holding the latest events in its "data" DataFrame.
+    """
+    def __init__(self, econcal):
+        self.econcal = econcal
+
+    def fetch(self):
+        self.econcal = self.econcal.createNewsData()
+        return self.econcal.data
+
+
+class EconCalendarCache(object):
+    """
+    EconCalendarCache keeps a local copy of the economic calendar
+    and refreshes it from a source at most once every "ttl"
+    seconds, either on demand or from a background thread. Events
+    are identified by the source DataFrame's index. A refresh adds
+    the events it has not seen before and updates the ones that
+    have changed, e.g. when the actual figure of a scheduled event
+    is published.
+
+    Untraded events are kept in a queue per currency in the order
+    they were first seen, so the next event to trade for a currency
+    is found without scanning the whole calendar.
+    """
+    def __init__(self, source, ttl=300.0):
+        self.source = source
+        self.ttl = ttl
+        self.events = {}
+        self.untraded = {}
+        self.traded = set()
+        self.last_refresh = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.logger = logging.getLogger(__name__)
+
+    def refresh(self):
+        """
+        Fetches the calendar and returns a list of the (key, event)
+        pairs that were new or changed, each event being a dict of
+        its columns.
+        """
+        df = self.source.fetch()
+        added = []
+        with self.lock:
+            for key, row in zip(df.index, df.to_dict("records")):
+                if key in self.traded:
+                    row["trading"] = True
+                event = self.events.get(key)
+                if event is not None:
+                    if same_event(event, row):
+                        continue
+                    event.update(row)
+                else:
+                    event = self.events[key] = row
+                    self.untraded.setdefault(row["currency"], deque()).append(key)
+                added.append((key, event))
+                if bool(row.get("trading")):
+                    self.traded.add(key)
+            self.last_refresh = time.time()
+        return added
+
+    def is_stale(self):
+        return self.last_refresh is None or time.time() - self.last_refresh >= self.ttl
+
+    def refresh_if_stale(self):
+        if self.is_stale():
+            return self.refresh()
+        return []
+
+    def start(self):
+        """
+        Refreshes the calendar every "ttl" seconds on a daemon
+        thread until stop is called.
+        """
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run_refresh)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread = None
+
+    def run_refresh(self):
+        while not self.stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                self.logger.exception("Economic calendar refresh failed")
+            self.stop_event.wait(self.ttl)
+
+    def next_untraded(self, currency, ready=None):
+        """
+        Returns the (key, event) of the oldest untraded event for a
+        currency, or None if there is none. If "ready" is given,
+        events for which ready(event) is False, such as those whose
+        figures are not out yet, are passed over and kept for later.
+        """
+        with self.lock:
+            keys = self.untraded.get(currency)
+            while keys and keys[0] in self.traded:
+                keys.popleft()
+            for key in keys or ():
+                if key in self.traded:
+                    continue
+                event = self.events[key]
+                if ready is None or ready(event):
+                    return key, event
+        return None
+
+    def mark_traded(self, key):
+        with self.lock:
+            self.traded.add(key)
+            self.events[key]["trading"] = True
@@ -1,15 +1,40 @@
 import logging
+import os
 import pandas as pd
 
 from copy import deepcopy
+from analytics import calc_drawdowns, create_performance_report
 from event import OrderEvent
-from position import Position
+from position import Position, PRICE_SCALE
+from recorder import EquityRecorder
 
 class Portfolio(object):
     def __init__(
             self, ticker, events, backtest, base="USD", leverage=1,
-            equity= 1000000.00, risk_per_trade = 0.002,
+            equity= 1000000.00, risk_per_trade = 0.002, output_dir=".",
+            verbose=False, spill_dir=None, snapshot_interval=100,
+            fill_on_signal=True
     ):
+        """
+        The portfolio keeps a running total of the open profit of
+        all positions, adjusted on each tick only by the change in
+        the position of the pair that ticked, so valuing it does
+        not depend on the number of pairs.
+
+        In a backtest the balance and total open profit are
+        recorded in memory on each tick, and the open profit of
+        every pair once every "snapshot_interval" ticks. Rows are
+        only printed if "verbose" is True, and are spilled to
+        binary chunks under "spill_dir" on very long runs if it
+        is given. Trades are only logged, for the performance
+        report, in a backtest, so the log does not grow without
+        bound when trading live.
+
+        With "fill_on_signal" True, positions are updated at the
+        current quote as soon as a signal is acted on. Otherwise
+        only the order is sent, and positions change when the
+        execution handler reports a FillEvent through on_fill.
+        """
         self.ticker = ticker
         self.events = events
         self.base = base
@@ -18,90 +43,125 @@ class Portfolio(object):
         self.balance = deepcopy(self.equity)
         self.risk_per_trade = risk_per_trade
         self.backtest = backtest
+        self.output_dir = output_dir
+        self.verbose = verbose
+        self.spill_dir = spill_dir
+        self.snapshot_interval = snapshot_interval
+        self.fill_on_signal = fill_on_signal
+        self.ticks = 0
+        self.unrealised_fixed = 0
         self.trade_units = self.calc_risk_position_size()
         self.positions = {}
+        self.trades = []
         if self.backtest:
-            self.backtest_file = self.create_equity_file()
+            self.equity_recorder, self.pair_recorder = self.create_equity_recorders()
         self.logger = logging.getLogger(__name__)
 
     def calc_risk_position_size(self):
         #the amount size per trade is per 1k
         return (self.equity * self.risk_per_trade)/1000
 
-    def add_new_position(self, position_type, currency_pair, units):
-        ps = Position(self.base, position_type, currency_pair, units, self.ticker)
+    def add_new_position(self, position_type, currency_pair, units, price=None):
+        ps = Position(self.base, position_type, currency_pair, units, self.ticker, price)
         self.positions[currency_pair] = ps
+        self.unrealised_fixed += ps.profit_base_fixed
+
+    def revalue_position(self, ps, old_profit):
+        """
+        Recomputes the open profit of a position whose units have
+        changed and moves the running total by the difference.
+        """
+        ps.profit_base_fixed = ps.calculate_profit_base()
+        ps.profit_perc_fixed = ps.calculate_profit_perc()
+        self.unrealised_fixed += ps.profit_base_fixed - old_profit
 
-    def add_position_units(self, currency_pair, units):
+    def add_position_units(self, currency_pair, units, price=None):
         if currency_pair not in self.positions:
             return False
         else:
             ps = self.positions[currency_pair]
-            ps.add_units(units)
+            old_profit = ps.profit_base_fixed
+            ps.add_units(units, price)
+            self.revalue_position(ps, old_profit)
             return True
 
 #TODO allow the removal of units in a position
-    def remove_position_units(self, currency_pair, units):
+    def remove_position_units(self, currency_pair, units, price=None):
         if currency_pair not in self.positions:
             return False
         else:
             ps = self.positions[currency_pair]
-            pnl = ps.remove_units(units)
+            old_profit = ps.profit_base_fixed
+            pnl = float(ps.remove_units(units, price))
             self.balance += pnl
+            self.revalue_position(ps, old_profit)
             return True
 
-    def close_position(self, currency_pair):
+    def close_position(self, currency_pair, price=None):
         if currency_pair not in self.positions:
             return False
         else:
             ps = self.positions[currency_pair]
-            pnl = float(ps.close_position())
+            pnl = float(ps.close_position(price))
             self.balance += pnl
+            self.unrealised_fixed -= ps.profit_base_fixed
             del [self.positions[currency_pair]]
             return True
 
+    def unrealised(self):
+        return self.unrealised_fixed / PRICE_SCALE
+
+    def total_equity(self):
+        return self.balance + self.unrealised()
+
+    def pair_profits(self):
+        return [
+            self.positions[pair].profit_base_fixed / PRICE_SCALE
+            if pair in self.positions else 0.0
+            for pair in self.ticker.pairs
+        ]
+
     def update_portfolio(self, tick_event):
         """
-        This updates all positions ensuring an up to date
-        unrealised profit and loss (PnL).
+        This updates the position of the pair that ticked, ensuring
+        an up to date unrealised profit and loss (PnL).
         """
         currency_pair = tick_event.instrument
         if currency_pair in self.positions:
            ps = self.positions[currency_pair]
+           old_profit = ps.profit_base_fixed
            ps.update_position_price()
+           self.unrealised_fixed += ps.profit_base_fixed - old_profit
         if self.backtest:
-            out_line = "%s,%s" % (tick_event.time, self.balance)
-            for pair in self.ticker.pairs:
-                if pair in self.positions:
-                    out_line += ",%s" % self.positions[pair].profit_base
-                else:
-                    out_line += ",0.00"
-            out_line += "\n"
-            print(out_line[:-2])
-            self.backtest_file.write(out_line)
-
-    def create_equity_file(self):
-        filename = "backtest.csv"
-        out_file = open(filename, "w")
-        header = "Timestamp,Balance"
-        for pair in self.ticker.pairs:
-            header += ",%s" % pair
-        header += "\n"
-        out_file.write(header)
-        if self.backtest:
-            print(header[:-2])
-        return out_file
+            row = (self.balance, self.unrealised())
+            self.equity_recorder.record(tick_event.time, row)
+            if self.ticks % self.snapshot_interval == 0:
+                self.pair_recorder.record(tick_event.time, self.pair_profits())
+            self.ticks += 1
+            if self.verbose:
+                print("%s,%s,%s" % (tick_event.time, row[0], row[1]))
+
+    def create_equity_recorders(self):
+        columns = ["Balance", "Unrealised"]
+        if self.verbose:
+            print("Timestamp,%s" % ",".join(columns))
+        pair_spill_dir = None
+        if self.spill_dir is not None:
+            pair_spill_dir = os.path.join(self.spill_dir, "pairs")
+        return (
+            EquityRecorder(columns, spill_dir=self.spill_dir),
+            EquityRecorder(self.ticker.pairs, spill_dir=pair_spill_dir)
+        )
 
     def output_results(self):
-        # Closes off the Backtest.csv file so it can be
-        # read via Pandas without problems
-        self.backtest_file.close()
-        in_filename = "backtest.csv"
-        out_filename = "equity.csv"
-        in_file = in_filename
+        out_filename = os.path.join(self.output_dir, "equity.csv")
         out_file = out_filename
-        # Create equity curve dataframe
-        df = pd.read_csv(in_file, index_col=0)
+        # Write the sampled per-pair open profits
+        self.pair_recorder.to_dataframe().to_csv(
+            os.path.join(self.output_dir, "pairs.csv"), index=True
+        )
+        # Create equity curve dataframe from the recorded rows
+        df = self.equity_recorder.to_dataframe()
         df.dropna(inplace=True)
         df["Total"] = df.sum(axis=1)
         df["Returns"] = df["Total"].pct_change()
@@ -111,6 +171,10 @@ class Portfolio(object):
         df["Drawdown"] = drawdown
         df.to_csv(out_file, index=True)
         print("Simulation complete and results exported to %s" % out_filename)
+        open_pnl = dict(zip(self.ticker.pairs, self.pair_profits()))
+        report = create_performance_report(df, self.trades, open_pnl)
+        print(report)
+        return report
 
     def create_drawdowns(self, pnl):
         """
@@ -122,24 +186,26 @@ class Portfolio(object):
         Returns:
         drawdown, duration - Highest peak-to-trough drawdown and duration.
         """
-        # Calculate the cumulative returns curve
-        # and set up the High Water Mark
-        hwm = [0]
-        # Create the drawdown and duration series
-        idx = pnl.index
-        drawdown = pd.Series(index=idx)
-        duration = pd.Series(index=idx)
-        # Loop over the index range
-        for t in range(1, len(idx)):
-           hwm.append(max(hwm[t - 1], pnl.iloc[t]))
-           drawdown.iloc[t] = (hwm[t] - pnl.iloc[t])
-           duration.iloc[t] = (0 if drawdown.iloc[t] == 0 else duration.iloc[t - 1] + 1)
+        drawdown, duration = calc_drawdowns(pnl.values)
+        drawdown = pd.Series(drawdown, index=pnl.index)
         return drawdown, drawdown.max(), duration.max()
 
     def execute_signal(self, signal_event):
         side = signal_event.side
         currency_pair = signal_event.instrument
         units = int(self.trade_units)
+        if not self.fill_on_signal:
+            # Close the whole position on an opposite signal and
+            # leave the position changes to on_fill
+            ps = self.positions.get(currency_pair)
+            if ps is not None and (side == "true") != (ps.position_type == "long"):
+                units = ps.units
+            order = OrderEvent(currency_pair, units, "AtMarket", side)
+            self.logger.info(order)
+            self.events.put(order)
+            return
+        balance = self.balance
+        traded_units = units
         # If there is no position, create one
         if currency_pair not in self.positions:
             if side == "true":
@@ -153,13 +219,50 @@ class Portfolio(object):
             if side == "true" and ps.position_type == "long":
                 self.add_position_units(currency_pair, units)
             elif side == "false" and ps.position_type == "long":
+                traded_units = ps.units
                 self.close_position(currency_pair)
             elif side == "true" and ps.position_type == "short":
+                traded_units = ps.units
                 self.close_position(currency_pair)
             elif side == "false" and ps.position_type == "short":
                 self.add_position_units(currency_pair, units)
 
+        if self.backtest:
+            self.trades.append((
+                signal_event.time, currency_pair, side, traded_units,
+                float(self.balance - balance)
+            ))
         order = OrderEvent(currency_pair, units, "AtMarket", side)
         self.logger.info(order)
         self.events.put(order)
         self.logger.info("Portfolio Balance: %0.2f" % self.balance)
+
+    def on_fill(self, fill_event):
+        """
+        Applies a (possibly partial) fill reported by the execution
+        handler to the positions, at the fill price. Units filled
+        against an opposite position reduce it, closing it once
+        they reach its size.
+        """
+        side = fill_event.side
+        currency_pair = fill_event.instrument
+        units = int(fill_event.units)
+        price = fill_event.price
+        balance = self.balance
+        ps = self.positions.get(currency_pair)
+        if ps is None:
+            position_type = "long" if side == "true" else "short"
+            self.add_new_position(position_type, currency_pair, units, price)
+        elif (side == "true") == (ps.position_type == "long"):
+            self.add_position_units(currency_pair, units, price)
+        elif units >= ps.units:
+            units = ps.units
+            self.close_position(currency_pair, price)
+        else:
+            self.remove_position_units(currency_pair, units, price)
+        if self.backtest:
+            self.trades.append((
+                fill_event.time, currency_pair, side, units,
+                float(self.balance - balance)
+            ))
+        self.logger.info("Portfolio Balance: %0.2f" % self.balance)
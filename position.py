@@ -1,94 +1,179 @@
 from decimal import Decimal, getcontext, ROUND_HALF_DOWN
+from math import gcd
+
+# Prices are held as integers in units of 1e-5
+PRICE_PLACES = 5
+PRICE_SCALE = 10 ** PRICE_PLACES
+
+
+def to_fixed(price):
+    """
+    Converts a price quoted to five decimal places (a Decimal,
+    float or string) into an integer number of 1e-5 units.
+    """
+    return int(round(float(price) * PRICE_SCALE))
+
+
+def from_fixed(value, places=PRICE_PLACES):
+    """
+    Converts an integer number of 10**-places units into a Decimal
+    with exactly "places" decimal places.
+    """
+    exp = Decimal(1).scaleb(-places)
+    return Decimal(value).scaleb(-places).quantize(exp)
+
+
+def div_round_half_down(num, den):
+    """
+    Divides two integers, rounding the result to the nearest
+    integer with ties going towards zero, as ROUND_HALF_DOWN does.
+    """
+    if den < 0:
+        num, den = -num, -den
+    q, r = divmod(abs(num), den)
+    if 2 * r > den:
+        q += 1
+    return q if num >= 0 else -q
 
 
 class Position(object):
-    def __init__(self, home_currency,position_type, currency_pair, units, ticker):
+    """
+    Position tracks a single open position in a currency pair.
+
+    All of the per-tick arithmetic is done in integer fixed point:
+    prices are held in units of 1e-5, pips and profits in units of
+    1e-5 and the average entry price as an exact fraction. The
+    results round exactly as the Decimal quantize calls they
+    replace did, and are only turned back into Decimal when the
+    profit_base/profit_perc attributes are read or a position is
+    closed.
+
+    Opening, adding, removing and closing use the current ticker
+    quote, unless an explicit fill "price" is given, as it is by
+    a simulated broker.
+    """
+    def __init__(self, home_currency,position_type, currency_pair, units, ticker, price=None):
         self.home_currency = home_currency
         self.position_type = position_type
         self.currency_pair = currency_pair
-        self.units = units
+        self.units = int(units)
         self.ticker = ticker
-        self.set_up_currencies()
-        self.profit_base = self.calculate_profit_base()
-        self.profit_perc = self.calculate_profit_perc()
+        self.mult = -1000 if self.position_type == "short" else 1000
+        self.set_up_currencies(price)
+        self.profit_base_fixed = self.calculate_profit_base()
+        self.profit_perc_fixed = self.calculate_profit_perc()
 
-    def set_up_currencies(self):
+    def set_up_currencies(self, price=None):
         ticker_cur = self.ticker.prices[self.currency_pair]
         if self.position_type == "long":
-            self.avg_price = Decimal(str(ticker_cur["ask"]))
-            self.cur_price = Decimal(str(ticker_cur["bid"]))
+            self.avg_num = to_fixed(ticker_cur["ask"] if price is None else price)
+            self.cur_fixed = to_fixed(ticker_cur["bid"])
         else:
-            self.avg_price = Decimal(str(ticker_cur["bid"]))
-            self.cur_price = Decimal(str(ticker_cur["ask"]))
+            self.avg_num = to_fixed(ticker_cur["bid"] if price is None else price)
+            self.cur_fixed = to_fixed(ticker_cur["ask"])
+        # The average price is avg_num / avg_den in 1e-5 units
+        self.avg_den = 1
+
+    @property
+    def avg_price(self):
+        return Decimal(self.avg_num) / self.avg_den / PRICE_SCALE
+
+    @property
+    def cur_price(self):
+        return from_fixed(self.cur_fixed)
+
+    @property
+    def profit_base(self):
+        return from_fixed(self.profit_base_fixed)
+
+    @property
+    def profit_perc(self):
+        return from_fixed(self.profit_perc_fixed)
 
     def calculate_pips(self):
-        mult = Decimal("1000")
-        if self.position_type == "long":
-            mult = Decimal("1000")
-        elif self.position_type == "short":
-            mult = Decimal("-1000")
-        pips = (mult * (self.cur_price - self.avg_price)).quantize(
-            Decimal("0.00001"), ROUND_HALF_DOWN
+        """
+        Returns the pips of the position in units of 1e-5.
+        """
+        return div_round_half_down(
+            self.mult * (self.cur_fixed * self.avg_den - self.avg_num), self.avg_den
         )
-        return pips
 
     def calculate_profit_base(self):
+        """
+        Returns the open profit of the position in units of 1e-5.
+        """
         pips = self.calculate_pips()
         ticker_qh = self.ticker.prices[self.currency_pair]
         if self.position_type == "long":
-            qh_close = Decimal(str(ticker_qh["bid"]))
+            qh_close = to_fixed(ticker_qh["bid"])
         else:
-            qh_close = Decimal(str(ticker_qh["ask"]))
-        profit = pips * qh_close * Decimal(str(self.units))
-        return profit.quantize(
-            Decimal("0.00001"), ROUND_HALF_DOWN
-        )
+            qh_close = to_fixed(ticker_qh["ask"])
+        return div_round_half_down(pips * qh_close * self.units, PRICE_SCALE)
 
     def calculate_profit_perc(self):
-        return (self.profit_base / self.units * Decimal("100.00")).quantize(
-            Decimal("0.00001"), ROUND_HALF_DOWN
-        )
+        """
+        Returns the open profit per unit, as a percentage, in
+        units of 1e-5.
+        """
+        return div_round_half_down(self.profit_base_fixed * 100, self.units)
 
     def update_position_price(self):
         ticker_cur = self.ticker.prices[self.currency_pair]
         if self.position_type == "long":
-            self.cur_price = Decimal(str(ticker_cur["bid"]))
+            self.cur_fixed = to_fixed(ticker_cur["bid"])
         else:
-            self.cur_price = Decimal(str(ticker_cur["ask"]))
-        self.profit_base = self.calculate_profit_base()
-        self.profit_perc = self.calculate_profit_perc()
+            self.cur_fixed = to_fixed(ticker_cur["ask"])
+        self.profit_base_fixed = self.calculate_profit_base()
+        self.profit_perc_fixed = self.calculate_profit_perc()
 
-    def add_units(self, units):
+    def add_units(self, units, price=None):
         cp = self.ticker.prices[self.currency_pair]
-        if self.position_type == "long":
-            add_price = cp["ask"]
+        if price is not None:
+            add_price = to_fixed(price)
+        elif self.position_type == "long":
+            add_price = to_fixed(cp["ask"])
         else:
-            add_price = cp["bid"]
+            add_price = to_fixed(cp["bid"])
+        units = int(units)
         new_total_units = self.units + units
-        new_total_cost = self.avg_price * self.units + add_price * units
-        self.avg_price = new_total_cost / new_total_units
+        num = self.avg_num * self.units + add_price * units * self.avg_den
+        den = self.avg_den * new_total_units
+        div = gcd(num, den)
+        self.avg_num = num // div
+        self.avg_den = den // div
         self.units = new_total_units
 
-    def remove_units(self, units):
-        dec_units = Decimal(str(units))
+    def realised_pnl(self, quote_close, units):
+        """
+        Returns the PnL of closing "units" at "quote_close" (in
+        1e-5 units) as a Decimal rounded to the cent.
+        """
+        pnl = div_round_half_down(
+            self.calculate_pips() * quote_close * units, PRICE_SCALE * 1000
+        )
+        getcontext().rounding = ROUND_HALF_DOWN
+        return from_fixed(pnl, 2)
+
+    def remove_units(self, units, price=None):
+        units = int(units)
         ticker_quote = self.ticker.prices[self.currency_pair]
-        if self.position_type == "long":
-            quote_close = ticker_quote["ask"]
+        if price is not None:
+            quote_close = self.cur_fixed = to_fixed(price)
+        elif self.position_type == "long":
+            quote_close = to_fixed(ticker_quote["ask"])
         else:
-            quote_close = ticker_quote["bid"]
-        self.units -= dec_units
+            quote_close = to_fixed(ticker_quote["bid"])
+        self.units -= units
         # Calculate PnL
-        pnl = self.calculate_pips() * quote_close * dec_units
-        getcontext().rounding = ROUND_HALF_DOWN
-        return pnl.quantize(Decimal("0.01"))
+        return self.realised_pnl(quote_close, units)
 
-    def close_position(self):
+    def close_position(self, price=None):
         ticker_quote = self.ticker.prices[self.currency_pair]
-        if self.position_type == "long":
-            quote_close = Decimal(str(ticker_quote["bid"]))
+        if price is not None:
+            quote_close = self.cur_fixed = to_fixed(price)
+        elif self.position_type == "long":
+            quote_close = to_fixed(ticker_quote["bid"])
         else:
-            quote_close = Decimal(str(ticker_quote["ask"]))
+            quote_close = to_fixed(ticker_quote["ask"])
         # Calculate PnL
-        pnl = self.calculate_pips() * quote_close * Decimal(str(self.units))
-        getcontext().rounding = ROUND_HALF_DOWN
-        return pnl.quantize(Decimal("0.01"))
+        return self.realised_pnl(quote_close, self.units)
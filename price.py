@@ -1,8 +1,28 @@
-
 from decimal import Decimal, getcontext, ROUND_HALF_DOWN
+import heapq
+import itertools
+import numpy as np
 import pandas as pd
 
-from event import TickEvent
+from event import TickEvent, TickBatch
+
+
+def times_to_ns(times):
+    """
+    Converts an array of tick times into int64 epoch nanoseconds
+    in one go, numbers being taken as epoch seconds and anything
+    else parsed as a datetime. Returns None if the times cannot
+    be parsed.
+    """
+    times = np.asarray(times)
+    if times.dtype.kind in "iuf":
+        return (times * 1e9).astype(np.int64)
+    try:
+        if times.dtype.kind != "M":
+            times = pd.to_datetime(times, format="ISO8601").values
+        return times.astype("datetime64[ns]").astype(np.int64)
+    except (ValueError, TypeError):
+        return None
 
 class HistoricCSVPriceHandler(object):
     """
@@ -10,7 +30,7 @@ class HistoricCSVPriceHandler(object):
     tick data for each requested currency pair and stream those
     to the provided events queue.
     """
-    def __init__(self, pairs, events_queue):
+    def __init__(self, pairs, events_queue, chunksize=100000):
         """
         Initialises the historic data handler by requesting
         the location of the CSV files and a list of symbols.
@@ -18,22 +38,90 @@ class HistoricCSVPriceHandler(object):
         It will be assumed that all files are of the form
         'pair.csv', where "pair" is the currency pair. For
         GBP/USD the filename is GBPUSD.csv.
+
+        Each file is opened once and read in blocks of
+        "chunksize" rows, so memory use does not depend on
+        the length of the history being replayed. The files
+        of all pairs are merged on timestamp, holding at most
+        one block per pair in memory.
         """
         self.pairs = pairs
         self.events_queue = events_queue
+        self.chunksize = chunksize
         self.prices = self.set_up_prices_dict()
         self.pair_frames = {}
+        self.decimal_cache = {}
+        self.event_pool = None
         self.continue_backtest = True
         self.cur_date_indx = 0
+        self.ticks = self.merge_pair_ticks()
 
     def set_up_prices_dict(self):
         price_dict = dict(
             (k, v) for k,v in [
-                (p, {"bid": None, "ask": None, "time": None}) for p in self.pairs
+                (p, {"bid": None, "ask": None, "time": None, "time_ns": None})
+                for p in self.pairs
             ]
         )
         return price_dict
 
+    def read_pair_chunks(self, pair):
+        """
+        Lazily yields (time, bid, ask) column arrays for the
+        given pair, one block of at most "chunksize" rows at
+        a time. Only the three columns used by the replay
+        are parsed.
+        """
+        reader = pd.read_csv(
+            "%s.csv" % pair.replace("/",""),
+            usecols=["time", "bidopen", "askopen"],
+            chunksize=self.chunksize
+        )
+        for df in reader:
+            yield (
+                df["time"].values,
+                df["bidopen"].values,
+                df["askopen"].values
+            )
+
+    def to_decimal(self, price):
+        """
+        Converts a raw float price into a Decimal quantized to
+        five decimal places. FX prices repeat heavily, so the
+        result is cached per distinct raw value.
+        """
+        try:
+            return self.decimal_cache[price]
+        except KeyError:
+            dec = Decimal(str(price)).quantize(Decimal("0.00001"))
+            self.decimal_cache[price] = dec
+            return dec
+
+    def read_pair_ticks(self, pair_indx, pair):
+        """
+        Yields (time, pair_indx, bid, ask, time_ns) tuples for a
+        single pair in file order. The pair index breaks
+        timestamp ties so that the merged order is deterministic.
+        Each block's times are converted to epoch nanoseconds at
+        once, for consumers such as SimulatedBroker that work in
+        them, rather than parsed again tick by tick.
+        """
+        for times, bids, asks in self.read_pair_chunks(pair):
+            times_ns = times_to_ns(times)
+            times_ns = [None] * len(times) if times_ns is None else times_ns.tolist()
+            for tick in zip(times.tolist(), itertools.repeat(pair_indx),
+                            bids.tolist(), asks.tolist(), times_ns):
+                yield tick
+
+    def merge_pair_ticks(self):
+        """
+        Performs a lazy k-way heap merge of every pair's tick
+        stream on timestamp. Each file is assumed to already
+        be sorted by time.
+        """
+        return heapq.merge(*[
+            self.read_pair_ticks(i, p) for i, p in enumerate(self.pairs)
+        ])
 
     def stream_next_tick(self):
         """
@@ -47,21 +135,58 @@ class HistoricCSVPriceHandler(object):
         of this class and places a single tick onto the queue, as
         well as updating the current bid/ask and inverse bid/ask.
         """
-        df = pd.read_csv("%s.csv" % self.pairs[0].replace("/",""))
-        end = len(df)
-        if(self.cur_date_indx < end):
-            row = df[self.cur_date_indx:(self.cur_date_indx + 1)]
-            bid = Decimal(str(row["bidopen"][self.cur_date_indx])).quantize(Decimal("0.00001"))
-            ask = Decimal(str(row["askopen"][self.cur_date_indx])).quantize(Decimal("0.00001")        )
-            time = row["time"][self.cur_date_indx]
-            # Create decimalised prices for traded pair
-            self.prices[self.pairs[0]]["bid"] = bid
-            self.prices[self.pairs[0]]["ask"] = ask
-            self.prices[self.pairs[0]]["time"] = time
-            # Create the tick event for the queue
-            tev = TickEvent(self.pairs[0], time, bid, ask)
-            self.events_queue.put(tev)
-            self.cur_date_indx += 1
-        else:
+        try:
+            time, pair_indx, raw_bid, raw_ask, time_ns = next(self.ticks)
+        except StopIteration:
             self.continue_backtest = False
-            return
\ No newline at end of file
+            return
+        tev = self.update_prices(self.pairs[pair_indx], time, raw_bid, raw_ask, time_ns)
+        self.events_queue.put(tev)
+
+    def update_prices(self, pair, time, raw_bid, raw_ask, time_ns=None):
+        """
+        Sets the current decimalised bid/ask for a pair, and its
+        time in epoch nanoseconds if known, and returns the
+        corresponding tick event.
+        """
+        bid = self.to_decimal(raw_bid)
+        ask = self.to_decimal(raw_ask)
+        # Create decimalised prices for traded pair
+        self.prices[pair]["bid"] = bid
+        self.prices[pair]["ask"] = ask
+        self.prices[pair]["time"] = time
+        self.prices[pair]["time_ns"] = time_ns
+        self.cur_date_indx += 1
+        # Create the tick event for the queue
+        if self.event_pool is not None:
+            return self.event_pool.acquire(pair, time, bid, ask)
+        return TickEvent(pair, time, bid, ask)
+
+    def stream_next_batch(self, size):
+        """
+        Returns the next "size" ticks, across all pairs, as a
+        TickBatch without placing anything on the queue or
+        updating the current prices. Each row should later be
+        passed to replay_batch_tick in order. Returns None once
+        the data is exhausted.
+        """
+        rows = list(itertools.islice(self.ticks, size))
+        if not rows:
+            self.continue_backtest = False
+            return None
+        times, pair_indxs, bids, asks, times_ns = zip(*rows)
+        return TickBatch(
+            [self.pairs[i] for i in pair_indxs], list(times), bids, asks,
+            None if times_ns[0] is None else times_ns
+        )
+
+    def replay_batch_tick(self, batch, i):
+        """
+        Makes row "i" of a batch the current price of its pair and
+        returns it as a tick event.
+        """
+        return self.update_prices(
+            batch.instruments[i], batch.time[i],
+            float(batch.bid[i]), float(batch.ask[i]),
+            None if batch.time_ns is None else int(batch.time_ns[i])
+        )
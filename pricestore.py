@@ -0,0 +1,172 @@
+import os
+import numpy as np
+import pandas as pd
+
+from price import HistoricCSVPriceHandler
+
+SECONDS_PER_DAY = 86400
+
+
+def to_epoch_seconds(t):
+    """
+    Converts a timestamp given as epoch seconds, a string, a
+    datetime or a numpy datetime64 into integer epoch seconds.
+    """
+    if t is None:
+        return None
+    if isinstance(t, (int, np.integer)):
+        return int(t)
+    return int(np.datetime64(t, 's').astype(np.int64))
+
+
+class NumpyTickStore(object):
+    """
+    NumpyTickStore is a column-oriented on-disk store of tick or
+    candle data. Each pair is partitioned by UTC day and every
+    column of a day is held in its own .npy file:
+
+        root/EURUSD/2017-05-07/time.npy
+        root/EURUSD/2017-05-07/bidopen.npy
+        ...
+
+    The "time" column holds int64 epoch seconds and is sorted
+    within a partition. Partitions are opened memory-mapped, so a
+    read over a time range only pages in the days it touches and
+    slices within a day are views rather than copies.
+    """
+    def __init__(self, root):
+        self.root = root
+
+    def pair_dir(self, pair):
+        return os.path.join(self.root, pair.replace("/", ""))
+
+    def days(self, pair):
+        """
+        Returns the sorted list of day partitions held for a pair.
+        """
+        path = self.pair_dir(pair)
+        if not os.path.isdir(path):
+            return []
+        return sorted(os.listdir(path))
+
+    def columns(self, pair, day):
+        path = os.path.join(self.pair_dir(pair), day)
+        return [f[:-4] for f in os.listdir(path) if f.endswith(".npy")]
+
+    def load_day(self, pair, day, columns=None):
+        """
+        Returns a dict of memory-mapped column arrays for a day.
+        """
+        path = os.path.join(self.pair_dir(pair), day)
+        if columns is None:
+            columns = self.columns(pair, day)
+        elif "time" not in columns:
+            columns = ["time"] + list(columns)
+        return dict(
+            (c, np.load(os.path.join(path, "%s.npy" % c), mmap_mode="r"))
+            for c in columns
+        )
+
+    def write(self, pair, df):
+        """
+        Writes a DataFrame into the store. The frame must have a
+        "time" column (or index) of datetimes or epoch seconds;
+        every other column is stored as float64. Rows falling on
+        a day that is already stored are merged with it, with
+        the new rows winning on duplicate timestamps.
+        """
+        if "time" not in df.columns:
+            df = df.reset_index()
+        times = df["time"].values
+        if np.issubdtype(times.dtype, np.datetime64):
+            times = times.astype("datetime64[s]").astype(np.int64)
+        df = df.assign(time=times.astype(np.int64))
+        day_keys = df["time"].values // SECONDS_PER_DAY
+        for day_key, day_df in df.groupby(day_keys):
+            day = str(np.datetime64(int(day_key), 'D'))
+            path = os.path.join(self.pair_dir(pair), day)
+            if os.path.isdir(path):
+                old = self.load_day(pair, day)
+                old_df = pd.DataFrame(dict((c, np.array(v)) for c, v in old.items()))
+                day_df = pd.concat([old_df, day_df], ignore_index=True)
+            day_df = day_df.drop_duplicates("time", keep="last").sort_values("time")
+            self.write_day(path, day_df)
+
+    def write_day(self, path, day_df):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for c in day_df.columns:
+            if c == "time":
+                values = day_df[c].values.astype(np.int64)
+            else:
+                values = day_df[c].values.astype(np.float64)
+            np.save(os.path.join(path, "%s.npy" % c), values)
+
+    def iter_slices(self, pair, start=None, end=None, columns=None):
+        """
+        Lazily yields one dict of column arrays per day partition
+        covering [start, end). The arrays are views onto the
+        memory-mapped files, so no price data is copied.
+        """
+        start = to_epoch_seconds(start)
+        end = to_epoch_seconds(end)
+        first_day = None if start is None else str(np.datetime64(start // SECONDS_PER_DAY, 'D'))
+        last_day = None if end is None else str(np.datetime64(end // SECONDS_PER_DAY, 'D'))
+        for day in self.days(pair):
+            if first_day is not None and day < first_day:
+                continue
+            if last_day is not None and day > last_day:
+                break
+            cols = self.load_day(pair, day, columns)
+            times = cols["time"]
+            lo = 0 if start is None else np.searchsorted(times, start, side="left")
+            hi = len(times) if end is None else np.searchsorted(times, end, side="left")
+            if lo < hi:
+                yield dict((c, v[lo:hi]) for c, v in cols.items())
+
+    def read(self, pair, start=None, end=None, columns=None):
+        """
+        Returns a DataFrame of the requested columns over
+        [start, end), indexed by datetime.
+        """
+        slices = list(self.iter_slices(pair, start, end, columns))
+        if not slices:
+            return pd.DataFrame(columns=columns)
+        data = dict(
+            (c, np.concatenate([s[c] for s in slices])) for c in slices[0]
+        )
+        df = pd.DataFrame(data)
+        df["time"] = pd.to_datetime(df["time"], unit='s')
+        return df.set_index("time")
+
+
+class HistoricNumpyPriceHandler(HistoricCSVPriceHandler):
+    """
+    HistoricNumpyPriceHandler replays ticks from a NumpyTickStore
+    rather than per-pair CSV files. Only the day partitions that
+    overlap [start, end) are opened. The default "store_root" is
+    where a CandleCache with its default root keeps H1 candles,
+    as filled by backtest.cache_historical.
+    """
+    def __init__(
+        self, pairs, events_queue, store_root=os.path.join("cache", "H1"),
+        start=None, end=None, bid_column="bidopen", ask_column="askopen"
+    ):
+        self.store = NumpyTickStore(store_root)
+        self.start = start
+        self.end = end
+        self.bid_column = bid_column
+        self.ask_column = ask_column
+        super(HistoricNumpyPriceHandler, self).__init__(pairs, events_queue)
+
+    def read_pair_chunks(self, pair):
+        """
+        Yields one (time, bid, ask) block per day partition.
+        """
+        columns = [self.bid_column, self.ask_column]
+        for cols in self.store.iter_slices(pair, self.start, self.end, columns):
+            yield (
+                cols["time"].astype("datetime64[s]"),
+                cols[self.bid_column],
+                cols[self.ask_column]
+            )
@@ -0,0 +1,108 @@
+import os
+import numpy as np
+import pandas as pd
+
+
+def time_array(times):
+    """
+    Converts an object array of timestamps into a typed array,
+    datetime64 for datetimes (in UTC if they carry a timezone)
+    and int64 or float64 for epoch numbers, so that chunks
+    written to disk keep their type. Returns the array and the
+    timezone stripped from it, if any. Times of any other kind
+    are left as objects.
+    """
+    index = pd.Index(list(times))
+    tz = None
+    if isinstance(index, pd.DatetimeIndex) and index.tz is not None:
+        tz = index.tz
+        index = index.tz_convert(None)
+    if index.dtype == object:
+        return np.asarray(times, dtype=object), None
+    return index.to_numpy(), tz
+
+
+class EquityRecorder(object):
+    """
+    EquityRecorder collects one row of float columns per timestamp
+    in preallocated NumPy buffers, doubling their size whenever
+    they fill, instead of writing a line of text per row.
+
+    If "spill_dir" is given, every "spill_rows" rows are written
+    out as a pair of .npy chunk files and the buffers reused, so
+    memory stays bounded on very long runs. to_dataframe reads any
+    spilled chunks back in order.
+    """
+    def __init__(self, columns, capacity=65536, spill_dir=None, spill_rows=1000000):
+        self.columns = list(columns)
+        self.capacity = capacity
+        self.spill_dir = spill_dir
+        self.spill_rows = spill_rows
+        if self.spill_dir is not None:
+            self.capacity = min(self.capacity, self.spill_rows)
+        self.times = np.empty(self.capacity, dtype=object)
+        self.values = np.empty((self.capacity, len(self.columns)), dtype=np.float64)
+        self.size = 0
+        self.chunks = []
+        self.tz = None
+
+    def record(self, time, row):
+        if self.size == self.capacity:
+            if self.spill_dir is not None and self.size >= self.spill_rows:
+                self.spill()
+            else:
+                self.grow()
+        self.times[self.size] = time
+        self.values[self.size] = row
+        self.size += 1
+
+    def grow(self):
+        new_capacity = self.capacity * 2
+        if self.spill_dir is not None:
+            new_capacity = min(new_capacity, self.spill_rows)
+        times = np.empty(new_capacity, dtype=object)
+        values = np.empty((new_capacity, len(self.columns)), dtype=np.float64)
+        times[:self.size] = self.times[:self.size]
+        values[:self.size] = self.values[:self.size]
+        self.times = times
+        self.values = values
+        self.capacity = new_capacity
+
+    def spill(self):
+        """
+        Writes the buffered rows to the next chunk files and
+        empties the buffers.
+        """
+        if self.size == 0:
+            return
+        if not os.path.isdir(self.spill_dir):
+            os.makedirs(self.spill_dir)
+        base = os.path.join(self.spill_dir, "chunk_%05d" % len(self.chunks))
+        times, self.tz = time_array(self.times[:self.size])
+        np.save(base + "_times.npy", times)
+        np.save(base + "_values.npy", self.values[:self.size])
+        self.chunks.append(base)
+        self.size = 0
+
+    def __len__(self):
+        return len(self.chunks) * self.spill_rows + self.size
+
+    def to_dataframe(self, index_name="Timestamp"):
+        """
+        Returns every recorded row as a DataFrame indexed by time.
+        """
+        times = [np.load(base + "_times.npy", allow_pickle=True) for base in self.chunks]
+        values = [np.load(base + "_values.npy") for base in self.chunks]
+        tz = self.tz
+        if not self.chunks:
+            times.append(self.times[:self.size])
+        elif self.size:
+            # Give the buffered times the same type as the chunks
+            current, tz = time_array(self.times[:self.size])
+            times.append(current)
+        values.append(self.values[:self.size])
+        index = pd.Index(np.concatenate(times), name=index_name)
+        if tz is not None:
+            index = index.tz_localize("UTC").tz_convert(tz)
+        df = pd.DataFrame(np.concatenate(values), columns=self.columns, index=index)
+        return df
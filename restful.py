@@ -1,13 +1,61 @@
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from latency import LatencyHistogram
 
 class RESTaccessor(object):
-    def __init__(self,ACCOUNT_ID,TRADING_API_URL,WEBSOCKET_PORT,ACCESS_TOKEN):
+    def __init__(
+        self, ACCOUNT_ID, TRADING_API_URL, WEBSOCKET_PORT, ACCESS_TOKEN,
+        pool_size=10, timeout=(3.05, 10.0), max_retries=3, backoff_factor=0.3
+    ):
+        """
+        All requests go through one keep-alive requests.Session
+        holding up to "pool_size" connections to the trading
+        server. "timeout" is a (connect, read) pair in seconds.
+
+        Failed connections are retried up to "max_retries" times
+        with exponential backoff. GET requests are also retried
+        on 5xx responses and on connections reset mid-response.
+        POST requests are never re-sent once they have reached
+        the server, so an order cannot be placed twice.
+        """
         self.ACCOUNT_ID = ACCOUNT_ID
         self.TRADING_API_URL = TRADING_API_URL
         self.WEBSOCKET_PORT = WEBSOCKET_PORT
         self.ACCESS_TOKEN = ACCESS_TOKEN
         self.bearer_access_token = ""
         self.socketIO = None
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.session = self.create_session()
+        self.latency = {}
+        self.latency_lock = threading.Lock()
+
+    def create_session(self):
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=self.max_retries,
+            status=self.max_retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
 
     #SocketIO definitions
     def on_error(self, ws, error):
@@ -24,16 +72,33 @@ class RESTaccessor(object):
         bt = "Bearer " + s + t
         return bt
 
-    def request_processor(self, method, params):
-        """ Trading server request help function. """
-
-        headers = {
+    def request_headers(self):
+        return {
             'User-Agent': 'request',
             'Authorization': self.bearer_access_token,
             'Accept': 'application/json',
             'Content-Type': 'application/x-www-form-urlencoded'
         }
-        rresp = requests.get(self.TRADING_API_URL + method, headers=headers, params=params)
+
+    def record_latency(self, method, seconds):
+        # Requests may be made from several threads at once, e.g.
+        # by BatchExecution, so the histogram is created under a
+        # lock and records under its own
+        with self.latency_lock:
+            hist = self.latency.get(method)
+            if hist is None:
+                hist = self.latency[method] = LatencyHistogram()
+        hist.record(seconds)
+
+    def latency_summary(self):
+        """
+        Returns a dict of endpoint -> round-trip latency summary.
+        """
+        with self.latency_lock:
+            latency = list(self.latency.items())
+        return dict((m, h.summary()) for m, h in latency)
+
+    def process_response(self, rresp):
         if rresp.status_code == 200:
             data = rresp.json()
             if data["response"]["executed"] is True:
@@ -42,20 +107,34 @@ class RESTaccessor(object):
         else:
             return False, rresp.status_code
 
+    def request_processor(self, method, params):
+        """ Trading server request help function. """
+
+        headers = self.request_headers()
+        start = time.perf_counter()
+        try:
+            rresp = self.session.get(
+                self.TRADING_API_URL + method, headers=headers,
+                params=params, timeout=self.timeout
+            )
+        except requests.exceptions.RequestException as e:
+            return False, str(e)
+        finally:
+            self.record_latency(method, time.perf_counter() - start)
+        return self.process_response(rresp)
+
     def post_request_processor(self, method, params):
         """ Trading server request help function. """
 
-        headers = {
-            'User-Agent': 'request',
-            'Authorization': self.bearer_access_token,
-            'Accept': 'application/json',
-            'Content-Type': 'application/x-www-form-urlencoded'
-        }
-        rresp = requests.post(self.TRADING_API_URL + method, headers=headers, data=params)
-        if rresp.status_code == 200:
-            data = rresp.json()
-            if data["response"]["executed"] is True:
-                return True, data
-            return False, data["response"]["error"]
-        else:
-            return False, rresp.status_code
+        headers = self.request_headers()
+        start = time.perf_counter()
+        try:
+            rresp = self.session.post(
+                self.TRADING_API_URL + method, headers=headers,
+                data=params, timeout=self.timeout
+            )
+        except requests.exceptions.RequestException as e:
+            return False, str(e)
+        finally:
+            self.record_latency(method, time.perf_counter() - start)
+        return self.process_response(rresp)
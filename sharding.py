@@ -0,0 +1,390 @@
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+import inspect
+import logging
+import multiprocessing
+
+from dispatcher import EventDispatcher
+from event import TickEvent, SignalEvent
+from execution import SimulatedExecution
+from portfolio import Portfolio
+
+
+def partition_instruments(instruments, num_shards):
+    """
+    Splits a list of instruments round-robin into "num_shards"
+    non-empty groups.
+    """
+    num_shards = max(1, min(num_shards, len(instruments)))
+    return [list(instruments[i::num_shards]) for i in range(num_shards)]
+
+
+class ShardTicker(object):
+    """
+    ShardTicker holds the latest prices of a shard's instruments,
+    in the same "prices" dict form as StreamingForexPrices, so it
+    can be given to a Portfolio as its ticker.
+    """
+    def __init__(self, instruments):
+        self.instruments = list(instruments)
+        self.pairs = self.instruments
+        self.prices = dict(
+            (p, {"bid": None, "ask": None, "time": None}) for p in self.instruments
+        )
+
+    def update_prices(self, symbol, time, bid, ask):
+        price = self.prices[symbol]
+        price["bid"] = bid
+        price["ask"] = ask
+        price["time"] = time
+        return TickEvent(symbol, time, bid, ask)
+
+
+def gross_units(portfolio):
+    return sum(ps.units for ps in portfolio.positions.values())
+
+
+def is_exit(portfolio, event):
+    """
+    Returns True if a signal would close an open position, i.e. it
+    is on the opposite side of the position held in its pair.
+    """
+    ps = portfolio.positions.get(event.instrument)
+    return ps is not None and (event.side == "true") != (ps.position_type == "long")
+
+
+def flatten(portfolio, ticker):
+    """
+    Closes every open position of a shard through the portfolio,
+    with an opposite signal at the latest tick time of its pair.
+    Returns a dict of the side each closed position was entered
+    on, by pair.
+    """
+    entries = {}
+    for pair, ps in list(portfolio.positions.items()):
+        entries[pair] = "true" if ps.position_type == "long" else "false"
+        side = "false" if ps.position_type == "long" else "true"
+        portfolio.execute_signal(
+            SignalEvent(pair, "AtMarket", side, ticker.prices[pair]["time"])
+        )
+    return entries
+
+
+def run_shard(shard_id, instruments, conn, reports, strategy, strategy_params,
+              portfolio_params, make_execution, report_every):
+    """
+    Runs one shard in a worker process: its own strategy,
+    portfolio and execution handler over "instruments", fed by
+    messages received on the pipe "conn":
+
+        ("ticks", [(symbol, time, bid, ask), ...])
+        ("halt",) / ("resume",)   stop or resume opening positions
+        ("flatten",)              close every open position
+        None                      shut down
+
+    While halted, only signals that close an open position are
+    acted on, so positions can still be exited. The strategy is
+    not told when its entry is dropped, or its position closed by
+    a flatten, and goes on to signal the exit of a position the
+    portfolio does not hold; that exit is dropped as well, rather
+    than opening a position the other way.
+
+    Every "report_every" ticks, and on shutdown, the shard puts
+    (shard_id, equity, gross units, ticks, done) on "reports".
+    """
+    events = queue.Queue()
+    ticker = ShardTicker(instruments)
+    strategy = strategy(ticker.instruments, events, **strategy_params)
+    portfolio = Portfolio(ticker, events, backtest=False, **portfolio_params)
+    execution = make_execution()
+    state = {"halted": False}
+    # The entry side, by pair, of the entries dropped or flattened
+    # whose exit the strategy has yet to signal
+    suppressed = {}
+
+    def execute_signal(event):
+        side = suppressed.get(event.instrument)
+        if side is not None:
+            if event.side != side:
+                del suppressed[event.instrument]
+                return
+            if state["halted"]:
+                return
+            del suppressed[event.instrument]
+        if state["halted"] and not is_exit(portfolio, event):
+            suppressed[event.instrument] = event.side
+            return
+        portfolio.execute_signal(event)
+
+    dispatcher = EventDispatcher(events)
+    dispatcher.register('TICK', strategy.calculate_signals, 'strategy')
+    dispatcher.register('TICK', portfolio.update_portfolio, 'portfolio')
+    dispatcher.register('SIGNAL', execute_signal, 'portfolio.signal')
+    dispatcher.register('ORDER', execution.execute_order, 'execution')
+    if hasattr(execution, 'flush'):
+        dispatcher.register_flush(execution.flush)
+
+    ticks = 0
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        if msg[0] == "ticks":
+            for symbol, time, bid, ask in msg[1]:
+                events.put(ticker.update_prices(symbol, time, bid, ask))
+                dispatcher.drain(block=False)
+                ticks += 1
+                if ticks % report_every == 0:
+                    reports.put((shard_id, portfolio.total_equity(), gross_units(portfolio), ticks, False))
+        elif msg[0] == "halt":
+            state["halted"] = True
+        elif msg[0] == "resume":
+            state["halted"] = False
+        elif msg[0] == "flatten":
+            suppressed.update(flatten(portfolio, ticker))
+            dispatcher.drain(block=False)
+    reports.put((shard_id, portfolio.total_equity(), gross_units(portfolio), ticks, True))
+
+
+class AccountAggregator(object):
+    """
+    AccountAggregator combines the latest equity and gross
+    position units reported by each shard into account-level
+    figures and checks them against the risk limits. A drawdown
+    from the account's high water mark beyond "max_drawdown" (a
+    fraction) stops trading for good; gross units above
+    "max_gross_units" halt it until they fall back within the
+    limit. A limit of None is not checked.
+    """
+    def __init__(self, num_shards, equity, max_drawdown=None, max_gross_units=None):
+        self.shard_equity = [equity / num_shards] * num_shards
+        self.shard_units = [0] * num_shards
+        self.high_water_mark = equity
+        self.max_drawdown = max_drawdown
+        self.max_gross_units = max_gross_units
+        self.stopped = False
+
+    def update(self, shard_id, equity, units):
+        self.shard_equity[shard_id] = equity
+        self.shard_units[shard_id] = units
+        self.high_water_mark = max(self.high_water_mark, self.equity())
+
+    def equity(self):
+        return sum(self.shard_equity)
+
+    def gross_units(self):
+        return sum(self.shard_units)
+
+    def drawdown(self):
+        return (self.high_water_mark - self.equity()) / self.high_water_mark
+
+    def breached(self):
+        """
+        Returns True while trading should be halted.
+        """
+        if self.max_drawdown is not None and self.drawdown() > self.max_drawdown:
+            self.stopped = True
+        if self.stopped:
+            return True
+        return self.max_gross_units is not None and self.gross_units() > self.max_gross_units
+
+
+class ShardedTradingSupervisor(object):
+    """
+    ShardedTradingSupervisor splits the instruments across
+    "num_shards" worker processes, each running its own strategy,
+    Portfolio and execution handler under its own GIL, so
+    CPU-heavy strategies scale with the number of cores.
+
+    Market data is published to the supervisor, which fans each
+    tick out over a pipe to the one shard trading its instrument.
+    Shards report their equity and gross units on a shared queue
+    to an AccountAggregator, and the supervisor halts or resumes
+    every shard as the account-level risk limits are breached or
+    cleared.
+
+    "make_execution" is called with no arguments in each worker
+    to build its execution handler, so it must be picklable, e.g.
+    a module-level function creating an Execution with its own
+    RESTaccessor. The account "equity" is split evenly between
+    the shards, and each shard's "risk_per_trade" is scaled up by
+    the number of shards, so every trade is the same number of
+    units as in a single Portfolio holding the whole account. A
+    ValueError is raised if that comes to less than one unit.
+
+    Halted shards still act on signals that close a position, so
+    gross units can fall back within their limit. When the
+    drawdown limit stops trading, every shard's positions are
+    closed. A shard whose process dies halts every other shard
+    for good, as the account's risk is no longer known.
+    """
+    def __init__(
+        self, instruments, strategy, strategy_params=None, num_shards=None,
+        equity=1000000.0, portfolio_params=None, make_execution=SimulatedExecution,
+        max_drawdown=None, max_gross_units=None, report_every=100
+    ):
+        self.shards = partition_instruments(
+            instruments, num_shards or multiprocessing.cpu_count()
+        )
+        self.strategy = strategy
+        self.strategy_params = strategy_params or {}
+        self.portfolio_params = dict(portfolio_params or {})
+        risk_per_trade = self.portfolio_params.get(
+            "risk_per_trade",
+            inspect.signature(Portfolio).parameters["risk_per_trade"].default
+        )
+        # Portfolio sizes trades as equity * risk_per_trade / 1000
+        # units, which must not change with the number of shards
+        if int(equity * risk_per_trade / 1000) < 1:
+            raise ValueError(
+                "Equity %.2f at risk_per_trade %s trades less than one unit" % (
+                    equity, risk_per_trade
+                )
+            )
+        self.portfolio_params["equity"] = equity / len(self.shards)
+        self.portfolio_params["risk_per_trade"] = risk_per_trade * len(self.shards)
+        self.make_execution = make_execution
+        self.report_every = report_every
+        self.owner = dict(
+            (pair, i) for i, pairs in enumerate(self.shards) for pair in pairs
+        )
+        self.aggregator = AccountAggregator(
+            len(self.shards), equity, max_drawdown, max_gross_units
+        )
+        self.halted = False
+        self.flattened = False
+        self.dead = set()
+        self.conns = []
+        self.processes = []
+        self.reports = None
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        self.reports = multiprocessing.Queue()
+        for shard_id, instruments in enumerate(self.shards):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=run_shard, args=(
+                shard_id, instruments, child_conn, self.reports, self.strategy,
+                self.strategy_params, self.portfolio_params, self.make_execution,
+                self.report_every
+            ))
+            process.daemon = True
+            process.start()
+            self.conns.append(parent_conn)
+            self.processes.append(process)
+
+    def publish(self, ticks):
+        """
+        Sends a list of (symbol, time, bid, ask) ticks to the shards
+        trading them, in one message per shard.
+        """
+        batches = {}
+        for tick in ticks:
+            shard_id = self.owner.get(tick[0])
+            if shard_id is not None:
+                batches.setdefault(shard_id, []).append(tick)
+        for shard_id, batch in batches.items():
+            if shard_id not in self.dead:
+                self.conns[shard_id].send(("ticks", batch))
+
+    def send_all(self, msg):
+        for shard_id, conn in enumerate(self.conns):
+            if shard_id not in self.dead:
+                conn.send(msg)
+
+    def check_shards(self):
+        """
+        Records the shards whose process has died, and returns
+        True if there are any.
+        """
+        for shard_id, process in enumerate(self.processes):
+            if shard_id not in self.dead and not process.is_alive():
+                self.dead.add(shard_id)
+                self.logger.error("Shard %d (%s) died with exit code %s" % (
+                    shard_id, ", ".join(self.shards[shard_id]), process.exitcode
+                ))
+        return bool(self.dead)
+
+    def poll(self):
+        """
+        Applies every pending shard report to the aggregator,
+        checks that every shard is alive, and halts or resumes the
+        shards if the risk limits require it.
+        """
+        while True:
+            try:
+                shard_id, equity, units, ticks, done = self.reports.get(False)
+            except queue.Empty:
+                break
+            self.aggregator.update(shard_id, equity, units)
+        dead = self.check_shards()
+        breached = self.aggregator.breached() or dead
+        if self.aggregator.stopped and not self.flattened:
+            self.flattened = True
+            self.send_all(("flatten",))
+        if breached != self.halted:
+            self.halted = breached
+            self.logger.warning("%s trading: equity %.2f, drawdown %.4f, gross units %s" % (
+                "Halting" if breached else "Resuming", self.aggregator.equity(),
+                self.aggregator.drawdown(), self.aggregator.gross_units()
+            ))
+            self.send_all(("halt",) if breached else ("resume",))
+
+    def stop(self, timeout=10.0):
+        """
+        Shuts the shards down and applies their final reports.
+        """
+        self.check_shards()
+        self.send_all(None)
+        # Read the reports before joining, as a process does not
+        # exit while what it put on the queue is unread
+        remaining = len(self.processes) - len(self.dead)
+        while remaining:
+            try:
+                shard_id, equity, units, ticks, done = self.reports.get(timeout=timeout)
+            except queue.Empty:
+                break
+            self.aggregator.update(shard_id, equity, units)
+            remaining -= done
+        for process in self.processes:
+            process.join(timeout)
+
+    def run(self, feed, num_ticks, batch_size=100):
+        """
+        Publishes "num_ticks" ticks from "feed", any object with a
+        next_tick method returning TickEvents such as
+        SimulatedPriceStream, in batches of "batch_size", polling
+        the shard reports after each batch.
+        """
+        sent = 0
+        while sent < num_ticks:
+            batch = []
+            for _ in range(min(batch_size, num_ticks - sent)):
+                tev = feed.next_tick()
+                batch.append((tev.instrument, tev.time, tev.bid, tev.ask))
+            self.publish(batch)
+            sent += len(batch)
+            self.poll()
+
+
+if __name__ == "__main__":
+    from mockserver import SimulatedPriceStream
+    from strategy import MovingAverageCrossStrategy
+
+    # Trade eight simulated pairs across four worker processes
+    logging.basicConfig(level=logging.INFO)
+    instruments = [
+        "EUR/USD", "USD/JPY", "GBP/USD", "USD/CHF",
+        "AUD/USD", "USD/CAD", "NZD/USD", "EUR/GBP"
+    ]
+    supervisor = ShardedTradingSupervisor(
+        instruments, MovingAverageCrossStrategy,
+        {"short_window": 10, "long_window": 50}, num_shards=4,
+        max_drawdown=0.05
+    )
+    supervisor.start()
+    supervisor.run(SimulatedPriceStream(instruments, seed=42), num_ticks=100000)
+    supervisor.stop()
+    print("Account equity: %.2f" % supervisor.aggregator.equity())
@@ -1,11 +1,42 @@
 import copy
 from event import SignalEvent
+from indicators import RollingSMA, rolling_sums, compare_averages
+from position import to_fixed, from_fixed, PRICE_SCALE
 
+import numpy as np
 import pandas as pd
-from newsmanaging import FXCMEconCal
+from newscache import EconCalendarCache, FXCMCalendarSource
 
 class Strategy(object):
-    pass
+    """
+    Strategy is the base class of every strategy. A strategy is
+    given the events queue on construction and must implement
+    calculate_signals, which receives one TickEvent at a time and
+    puts any resulting SignalEvents onto the queue.
+
+    A strategy may also implement calculate_signals_batch, which
+    receives a TickBatch of consecutive ticks and returns the
+    signals it emits as a list of (row index, SignalEvent) tuples
+    in row order, instead of putting them on the queue. The
+    backtester uses the batch path for strategies that provide
+    it, and must leave the strategy in the same state as feeding
+    the ticks one at a time would.
+
+    When bars are enabled in the backtester or live loop, the
+    strategy also receives each completed BarEvent through
+    calculate_bar_signals, which ignores them by default.
+    """
+    def calculate_signals(self, event):
+        raise NotImplementedError("Should implement calculate_signals()")
+
+    def calculate_bar_signals(self, event):
+        pass
+
+    def calculate_signals_batch(self, ticks):
+        raise NotImplementedError("Should implement calculate_signals_batch()")
+
+    def supports_batch(self):
+        return type(self).calculate_signals_batch is not Strategy.calculate_signals_batch
 
 class TestRandomStrategy(Strategy):
     def __init__(self, instrument, events):
@@ -27,17 +58,28 @@ class TestRandomStrategy(Strategy):
                     self.events.put(signal)
                     self.invested = False
 
+    def calculate_signals_batch(self, ticks):
+        signals = []
+        first = (-self.ticks - 1) % 5
+        for i in range(first, len(ticks), 5):
+            side = "false" if self.invested else "true"
+            signals.append((i, SignalEvent(ticks.instruments[i], "AtMarket", side, ticks.time[i])))
+            self.invested = not self.invested
+        self.ticks += len(ticks)
+        return signals
+
 
 class MovingAverageCrossStrategy(Strategy):
     def __init__(
         self, pairs, events,
-        short_window = 5, long_window = 20
+        short_window = 5, long_window = 20, verbose = False
     ):
         self.pairs = pairs
-        self.pairs_dict = self.create_pairs_dict()
         self.events = events
         self.short_window = short_window
         self.long_window = long_window
+        self.verbose = verbose
+        self.pairs_dict = self.create_pairs_dict()
 
     def create_pairs_dict(self):
         attr_dict = {
@@ -49,27 +91,19 @@ class MovingAverageCrossStrategy(Strategy):
         pairs_dict = {}
         for p in self.pairs:
             pairs_dict[p] = copy.deepcopy(attr_dict)
+            pairs_dict[p]["short_ind"] = RollingSMA(self.short_window)
+            pairs_dict[p]["long_ind"] = RollingSMA(self.long_window)
         return pairs_dict
 
-    def calc_rolling_sma(self, sma_m_1, window, price):
-        return ((sma_m_1 * (window - 1)) + price) / window
-
     def calculate_signals(self, event):
         if event.type == 'TICK':
             pair = event.instrument
             price = event.bid
             pd = self.pairs_dict[pair]
-            print(str(pd["short_sma"]) + " & " + str(pd["long_sma"]))
-            if pd["ticks"] == 0:
-                pd["short_sma"] = price
-                pd["long_sma"] = price
-            else:
-                pd["short_sma"] = self.calc_rolling_sma(
-                    pd["short_sma"], self.short_window, price
-                )
-                pd["long_sma"] = self.calc_rolling_sma(
-                    pd["long_sma"], self.long_window, price
-                )
+            if self.verbose:
+                print(str(pd["short_sma"]) + " & " + str(pd["long_sma"]))
+            pd["short_sma"] = pd["short_ind"].update(price)
+            pd["long_sma"] = pd["long_ind"].update(price)
             # Only start the strategy when we have created an accurate short window
             if pd["ticks"] > self.short_window:
                 if pd["short_sma"] > pd["long_sma"] and not pd["invested"]:
@@ -82,34 +116,104 @@ class MovingAverageCrossStrategy(Strategy):
                     pd["invested"] = False
             pd["ticks"] += 1
 
+    def calculate_signals_batch(self, ticks):
+        signals = []
+        for pair in self.pairs:
+            rows = np.nonzero(ticks.instruments == pair)[0]
+            if len(rows) > 0:
+                signals.extend(self.calculate_pair_signals_batch(pair, rows, ticks))
+        signals.sort(key=lambda s: s[0])
+        return signals
+
+    def calc_rolling_sums_batch(self, indicator, prices):
+        """
+        Returns the exact rolling sums and counts, in fixed-point
+        units, after each of an array of fixed-point prices,
+        continuing from the values already held by the RollingSMA
+        "indicator", and then advances the indicator with the same
+        Decimal prices the per-tick path would give it.
+        """
+        history = [to_fixed(x) for x in indicator.history()]
+        sums, counts = rolling_sums(history, prices, indicator.window)
+        indicator.extend(from_fixed(int(x)) for x in prices[-indicator.window:])
+        return sums, counts
+
+    def calculate_pair_signals_batch(self, pair, rows, ticks):
+        pd_ = self.pairs_dict[pair]
+        prices = np.rint(ticks.bid[rows] * PRICE_SCALE).astype(np.int64)
+        short_sums, short_counts = self.calc_rolling_sums_batch(pd_["short_ind"], prices)
+        long_sums, long_counts = self.calc_rolling_sums_batch(pd_["long_ind"], prices)
+        # Work out whether the strategy is invested after each
+        # tick, carrying the state over ticks where the averages
+        # are equal or the short window is not yet full. The
+        # averages are compared exactly, so ties fall as they do
+        # between the Decimal averages of calculate_signals
+        tick_nums = pd_["ticks"] + np.arange(len(rows))
+        cmp = compare_averages(short_sums, short_counts, long_sums, long_counts)
+        regime = np.where(cmp > 0, 1.0, np.where(cmp < 0, 0.0, np.nan))
+        regime[tick_nums <= self.short_window] = np.nan
+        invested = pd.Series(
+            np.concatenate(([1.0 if pd_["invested"] else 0.0], regime))
+        ).ffill().values
+        changes = np.nonzero(np.diff(invested))[0]
+        signals = []
+        for k in changes:
+            side = "true" if invested[k + 1] == 1.0 else "false"
+            row = rows[k]
+            signals.append((row, SignalEvent(pair, "AtMarket", side, ticks.time[row])))
+        pd_["short_sma"] = pd_["short_ind"].value
+        pd_["long_sma"] = pd_["long_ind"].value
+        pd_["invested"] = bool(invested[-1] == 1.0)
+        pd_["ticks"] += len(rows)
+        return signals
+
+def has_figures(data):
+    """
+    Returns True if a calendar event has both its actual and
+    previous figures, so the release can be traded.
+    """
+    return not (pd.isna(data['actual']) or pd.isna(data['previous']))
+
+
 class NewsDrivenStrategy(Strategy):
-    def __init__(self, instrument, events):
+    """
+    NewsDrivenStrategy trades the pair on economic calendar
+    releases: an actual figure below the previous one is taken as
+    weakening the currency it belongs to, and above as
+    strengthening it.
+
+    The calendar is held in an EconCalendarCache refreshed on a
+    background thread every "ttl" seconds, so the tick handler only
+    looks up the next untraded event for each currency of the pair.
+    A cache over a FileCalendarSource can be passed in to run from a
+    fixture instead of FXCM. Events whose actual or previous figure
+    is missing are left untraded until a refresh fills it in.
+    """
+    def __init__(self, instrument, events, calendar=None, ttl=300.0):
+        self.instrument = instrument
         self.quote = instrument[:3]
         self.base = instrument[4:]
         self.events = events
-        self.news = FXCMEconCal(instrument)
-
-    def UpdateData(self):
-        self.news = self.news.createNewsData()
+        if calendar is None:
+            from newsmanaging import FXCMEconCal
+            calendar = EconCalendarCache(FXCMCalendarSource(FXCMEconCal(instrument)), ttl)
+            calendar.start()
+        self.news = calendar
 
     def calculate_signals(self,event):
         if event.type == 'TICK':
-            self.UpdateData()
-            data = self.news.data
-            event = data.tail(1)
-            if(event['trading'].iloc[0] == False):
-                if(event['actual'].iloc[0] < event['previous'].iloc[0]):
-                    if(event['currency'] == self.base):
-                        signal = SignalEvent(event.instrument, "AtMarket", "true", event.time)
-                        self.events.put(signal)
-                    if(event['currency'] == self.quote):
-                        signal = SignalEvent(event.instrument, "AtMarket", "false", event.time)
-                        self.events.put(signal)
-                if (event['actual'].iloc[0] > event['previous'].iloc[0]):
-                    if (event['currency'] == self.base):
-                        signal = SignalEvent(event.instrument, "AtMarket", "false", event.time)
-                        self.events.put(signal)
-                    if (event['currency'] == self.quote):
-                        signal = SignalEvent(event.instrument, "AtMarket", "true", event.time)
-                        self.events.put(signal)
-                self.news.data.set_value(event.index, 'trader', True)
+            for currency in (self.base, self.quote):
+                news_event = self.news.next_untraded(currency, has_figures)
+                if news_event is None:
+                    continue
+                key, data = news_event
+                if data['actual'] < data['previous']:
+                    side = "true" if currency == self.base else "false"
+                elif data['actual'] > data['previous']:
+                    side = "false" if currency == self.base else "true"
+                else:
+                    side = None
+                if side is not None:
+                    signal = SignalEvent(event.instrument, "AtMarket", side, event.time)
+                    self.events.put(signal)
+                self.news.mark_traded(key)
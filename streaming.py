@@ -1,24 +1,112 @@
 import json
 import logging
+import logging.handlers
+import random
+import re
+import time
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
 from event import TickEvent
 
+# Use a faster JSON decoder when one is installed
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    try:
+        import ujson
+        json_loads = ujson.loads
+    except ImportError:
+        json_loads = json.loads
+
+# The layout FXCM sends price updates in. Matching it directly
+# avoids building a dict for every message; anything else falls
+# back to the JSON decoder, including symbols holding a JSON
+# escape, which the regex would return undecoded.
+PRICE_UPDATE_RE = re.compile(
+    r'\{"Updated":(\d+),"Rates":\[([^,\]]+),([^,\]]+)[^\]]*\],"Symbol":"([^"\\]*)"'
+)
+
+
+def parse_price_update(msg):
+    """
+    Returns the (symbol, time, bid, ask) of a price update message.
+    """
+    match = PRICE_UPDATE_RE.match(msg)
+    if match is not None:
+        time, bid, ask, symbol = match.groups()
+        return symbol, int(time), float(bid), float(ask)
+    response = json_loads(msg)
+    rates = response["Rates"]
+    return response["Symbol"], response["Updated"], rates[0], rates[1]
+
+
+def parse_price_update_json(msg):
+    """
+    Parses a price update by decoding the whole message, as
+    on_price_update originally did.
+    """
+    response = json.loads(msg)
+    return response["Symbol"], response["Updated"], response["Rates"][0], response["Rates"][1]
+
+
+def setup_queue_logging(logger, handlers):
+    """
+    Routes "logger" through a QueueHandler, so that records are
+    only put on a queue by the calling thread and formatted and
+    written by the given handlers on a QueueListener thread.
+    Returns the listener, which is already started; call its stop
+    method to flush it on shutdown.
+    """
+    log_queue = queue.Queue(-1)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.propagate = False
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+    return listener
+
+
 class StreamingForexPrices(object):
-    def __init__(self, RESTaccess, instrument, events_queue):
+    """
+    StreamingForexPrices turns the price updates of the FXCM
+    websocket into TickEvents on the events queue.
+
+    Updates are parsed by "parser", parse_price_update by default.
+    One in every "log_every" ticks is logged at DEBUG level, and
+    none if it is 0; the sampling is done before a log record is
+    built, so unlogged ticks cost a counter increment. Use
+    setup_queue_logging to keep the writing of the records off
+    the socket thread.
+    """
+    def __init__(self, RESTaccess, instrument, events_queue,
+                 parser=parse_price_update, log_every=0):
         self.RESTaccess = RESTaccess
         self.instruments = instrument
         self.events_queue = events_queue
         self.prices = self.set_up_prices_dict()
+        self.parser = parser
+        self.log_every = log_every
+        self.num_updates = 0
         self.logger = logging.getLogger(__name__)
 
     def stream_to_queue(self):
+        """
+        Subscribes to every instrument in a single /subscribe
+        request and registers the price update handler for each.
+        """
         print(self.RESTaccess.ACCESS_TOKEN)
-        for key in self.instruments:
-            status,response = self.RESTaccess.post_request_processor('/subscribe', {'pairs': key})
-            if status is True:
+        status,response = self.RESTaccess.post_request_processor(
+            '/subscribe', {'pairs': list(self.instruments)}
+        )
+        if status is True:
+            for key in self.instruments:
                 self.RESTaccess.socketIO.on(key, self.on_price_update)
-                print(response)
-            else:
-                print(("Error processing request: /subscribe: " + str(response)))
+            print(response)
+        else:
+            print(("Error processing request: /subscribe: " + str(response)))
 
     def set_up_prices_dict(self):
         price_dict = dict(
@@ -29,17 +117,88 @@ class StreamingForexPrices(object):
         return price_dict
 
     def on_price_update(self, msg):
-        response = json.loads(msg)
-        self.logger.info(response)
-        print(response)
-        time = response["Updated"]
-        bid = response["Rates"][0]
-        ask = response["Rates"][1]
-        symbol = response["Symbol"]
+        symbol, time, bid, ask = self.parser(msg)
+        if self.log_every:
+            self.num_updates += 1
+            if self.num_updates % self.log_every == 0:
+                self.logger.debug("tick %s %s %s %s", symbol, time, bid, ask)
         self.cur_ask = ask
         self.cur_bid = bid
-        self.prices[symbol]["bid"] = bid
-        self.prices[symbol]["ask"] = ask
-        self.prices[symbol]["time"] = time
+        price = self.prices[symbol]
+        price["bid"] = bid
+        price["ask"] = ask
+        price["time"] = time
         tev = TickEvent(symbol, time, bid, ask)
-        self.events_queue.put(tev)
\ No newline at end of file
+        self.events_queue.put(tev)
+
+
+def replay_messages(prices, messages, repeat=1):
+    """
+    Feeds recorded price update messages through on_price_update
+    "repeat" times and returns the number of messages handled per
+    second. Ticks are put on prices.events_queue, which is emptied
+    between passes.
+    """
+    count = 0
+    elapsed = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for msg in messages:
+            prices.on_price_update(msg)
+        elapsed += time.perf_counter() - start
+        count += len(messages)
+        while True:
+            try:
+                prices.events_queue.get(False)
+            except queue.Empty:
+                break
+    return count / elapsed if elapsed else 0.0
+
+
+def synthetic_messages(instruments, num_messages=100000):
+    """
+    Returns price update messages in the FXCM format for a random
+    walk of each instrument, for when no recording is available.
+    """
+    mids = dict((pair, 1.1) for pair in instruments)
+    updated = 1504167080000
+    messages = []
+    for i in range(num_messages):
+        pair = instruments[i % len(instruments)]
+        mids[pair] += random.gauss(0.0, 0.0001)
+        updated += 250
+        messages.append(json.dumps({
+            "Updated": updated,
+            "Rates": [round(mids[pair] - 0.0001, 5), round(mids[pair] + 0.0001, 5),
+                      round(mids[pair] + 0.001, 5), round(mids[pair] - 0.001, 5)],
+            "Symbol": pair
+        }, separators=(",", ":")))
+    return messages
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Measure the ingest rate of on_price_update, replaying the
+    # messages of a recording (one per line) if a file is given
+    instruments = ["EUR/USD", "GBP/USD", "USD/JPY"]
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            messages = [line.strip() for line in f if line.strip()]
+        instruments = sorted(set(parse_price_update(msg)[0] for msg in messages))
+    else:
+        messages = synthetic_messages(instruments)
+
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+    listener = setup_queue_logging(logger, [logging.FileHandler("replay.log")])
+    runs = [
+        ("json.loads", dict(parser=parse_price_update_json)),
+        ("fast parser", dict(parser=parse_price_update)),
+        ("fast parser, queue logging 1 in 1000", dict(log_every=1000))
+    ]
+    for name, kwargs in runs:
+        prices = StreamingForexPrices(None, instruments, queue.Queue(), **kwargs)
+        rate = replay_messages(prices, messages, repeat=3)
+        print("%s: %.0f messages/sec" % (name, rate))
+    listener.stop()
\ No newline at end of file
@@ -0,0 +1,127 @@
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from backtest import Backtest
+
+
+def run_single_backtest(args):
+    """
+    Runs one Backtest configuration inside a worker process and
+    returns a summary dict of its results. Defined at module level
+    so that it can be pickled by the process pool.
+    """
+    (
+        run_id, pairs, data_handler, strategy, strategy_params,
+        portfolio, execution, equity, output_dir
+    ) = args
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    backtest = Backtest(
+        pairs, data_handler, strategy, strategy_params,
+        portfolio, execution, equity=equity, output_dir=output_dir
+    )
+    backtest.simulate_trading()
+    report = backtest.results
+    summary = {"run_id": run_id, "output_dir": output_dir}
+    summary.update(strategy_params)
+    summary["final_total"] = report.equity_curve["Total"].iloc[-1]
+    summary.update(report.to_dict())
+    return summary
+
+
+class ParameterSweep(object):
+    """
+    ParameterSweep fans Backtest runs for many strategy parameter
+    sets out over a process pool. Every run writes its
+    equity.csv into its own directory under
+    "output_root", and the per-run summaries are collected into a
+    single table ranked by return.
+
+    To share price data between workers, pass a data handler that
+    reads from a memory-mapped store, e.g.
+
+        functools.partial(HistoricNumpyPriceHandler, store_root="cache/H1")
+
+    Every worker then maps the same .npy files and the operating
+    system keeps a single copy of the pages in its cache.
+    """
+    def __init__(
+        self, pairs, data_handler, strategy, portfolio, execution,
+        equity=1000000.0, output_root="sweep", max_workers=None
+    ):
+        self.pairs = pairs
+        self.data_handler = data_handler
+        self.strategy = strategy
+        self.portfolio = portfolio
+        self.execution = execution
+        self.equity = equity
+        self.output_root = output_root
+        self.max_workers = max_workers
+
+    def grid(self, param_grid):
+        """
+        Expands a dict of parameter name -> list of values into
+        every combination.
+        """
+        names = sorted(param_grid)
+        return [
+            dict(zip(names, values))
+            for values in itertools.product(*[param_grid[n] for n in names])
+        ]
+
+    def random(self, param_grid, n, seed=None):
+        """
+        Draws "n" distinct parameter sets at random from the grid.
+        """
+        combos = self.grid(param_grid)
+        rng = random.Random(seed)
+        return rng.sample(combos, min(n, len(combos)))
+
+    def run(self, param_sets):
+        """
+        Runs every parameter set and returns a DataFrame of run
+        summaries sorted by total return, best first.
+        """
+        if not os.path.isdir(self.output_root):
+            os.makedirs(self.output_root)
+        jobs = [
+            (
+                i, self.pairs, self.data_handler, self.strategy, params,
+                self.portfolio, self.execution, self.equity,
+                os.path.join(self.output_root, "run_%05d" % i)
+            )
+            for i, params in enumerate(param_sets)
+        ]
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            summaries = list(pool.map(run_single_backtest, jobs))
+        df = pd.DataFrame(summaries)
+        df.sort_values("total_return", ascending=False, inplace=True)
+        df.reset_index(drop=True, inplace=True)
+        df.to_csv(os.path.join(self.output_root, "summary.csv"), index=False)
+        return df
+
+
+if __name__ == "__main__":
+    from functools import partial
+    from strategy import MovingAverageCrossStrategy
+    from portfolio import Portfolio
+    from execution import SimulatedExecution
+    from pricestore import HistoricNumpyPriceHandler
+    from backtest import cache_historical
+
+    # Fill the candle cache first, as every run reads its H1 store
+    pairs = ["EUR/USD"]
+    cache_historical(pairs, cache_root="cache", period="H1")
+    sweep = ParameterSweep(
+        pairs, partial(HistoricNumpyPriceHandler, store_root=os.path.join("cache", "H1")),
+        MovingAverageCrossStrategy, Portfolio, SimulatedExecution
+    )
+    param_sets = sweep.grid({
+        "short_window": [5, 10, 20],
+        "long_window": [50, 100, 200]
+    })
+    print(sweep.run(param_sets))
@@ -0,0 +1,79 @@
+import asyncio
+
+from asynctrading import AsyncExecution, AsyncRESTaccessor, AsyncTradingRuntime
+from event import OrderEvent, TickEvent
+from mockserver import MockFXCMServer
+
+
+class SlowBuyServer(MockFXCMServer):
+    """
+    Takes longer over buys than sells, so that a sell sent while
+    the buy before it is outstanding would be recorded first.
+    """
+    async def open_trade(self, request):
+        data = await request.post()
+        if data.get('is_buy') == 'true':
+            await asyncio.sleep(0.02)
+        return await super(SlowBuyServer, self).open_trade(request)
+
+
+class RecordingPortfolio(object):
+    def __init__(self):
+        self.ticks = 0
+
+    def update_portfolio(self, event):
+        self.ticks += 1
+
+    def execute_signal(self, event):
+        pass
+
+
+class FailingStrategy(object):
+    def calculate_signals(self, event):
+        raise RuntimeError("strategy failed")
+
+
+def run_runtime(server, feed, strategy, portfolio):
+    async def main():
+        await server.start()
+        RESTaccess = AsyncRESTaccessor('1', server.url, server.port, 'token')
+        runtime = AsyncTradingRuntime(max_inflight_orders=10)
+        try:
+            await asyncio.wait_for(
+                runtime.run(strategy, portfolio, AsyncExecution(RESTaccess), feed), 30.0
+            )
+        finally:
+            await RESTaccess.close()
+            await server.stop()
+    asyncio.run(main())
+
+
+def test_every_order_arrives_in_order_per_instrument():
+    sent = [
+        OrderEvent(pair, 1000, "AtMarket", "true" if i % 2 == 0 else "false")
+        for i in range(20) for pair in ("EUR/USD", "USD/JPY")
+    ]
+
+    async def feed(events):
+        for order in sent:
+            events.put(order)
+
+    server = SlowBuyServer(port=0)
+    run_runtime(server, feed, FailingStrategy(), RecordingPortfolio())
+
+    assert len(server.orders) == len(sent)
+    for pair in ("EUR/USD", "USD/JPY"):
+        received = [o['is_buy'] for o in server.orders if o['symbol'] == pair]
+        assert received == [o.side for o in sent if o.instrument == pair]
+
+
+def test_raising_handler_does_not_hang_run():
+    async def feed(events):
+        for i in range(50):
+            events.put(TickEvent("EUR/USD", i, 1.1, 1.1001))
+            await asyncio.sleep(0)
+
+    portfolio = RecordingPortfolio()
+    run_runtime(MockFXCMServer(port=0), feed, FailingStrategy(), portfolio)
+
+    assert portfolio.ticks == 50
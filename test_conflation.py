@@ -0,0 +1,24 @@
+from bars import BarAggregator
+from conflation import ConflatingEventQueue
+from event import TickEvent
+
+
+def test_bars_see_ticks_that_are_conflated():
+    events = ConflatingEventQueue()
+    bars = BarAggregator(events, ("1m",))
+    events.add_tick_listener(bars.on_tick)
+    prices = [1.10, 1.13, 1.08, 1.11, 1.12]
+    for i, price in enumerate(prices):
+        events.put(TickEvent("EUR/USD", 1494086400 + i, price, price))
+    events.put(TickEvent("EUR/USD", 1494086460, 1.12, 1.12))
+
+    delivered = []
+    while not events.empty():
+        delivered.append(events.get(False))
+    bar = [e for e in delivered if e.type == 'BAR'][0]
+    ticks = [e for e in delivered if e.type == 'TICK']
+
+    assert len(ticks) == 1
+    assert events.stats()["conflated"] == 5
+    assert (bar.open, bar.high, bar.low, bar.close) == (1.10, 1.13, 1.08, 1.12)
+    assert bar.volume == 5
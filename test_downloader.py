@@ -0,0 +1,44 @@
+from downloader import CandleDownloader
+
+START = 1494115200
+HOUR = 3600
+DAY = 86400
+
+
+class StubRESTaccessor(object):
+    """
+    Answers /candles requests with one hourly candle per hour of
+    the requested range, ends included.
+    """
+    def __init__(self):
+        self.requests = []
+
+    def request_processor(self, method, params):
+        self.requests.append((method, params["from"], params["to"]))
+        first = -(-params["from"] // HOUR) * HOUR
+        candles = [
+            [t, 1.1, 1.1, 1.1, 1.1, 1.2, 1.2, 1.2, 1.2, 10]
+            for t in range(first, params["to"] + 1, HOUR)
+        ]
+        return True, {"candles": candles}
+
+
+def test_extended_range_refetches_the_shortened_window(tmp_path):
+    root = str(tmp_path)
+    rest = StubRESTaccessor()
+    downloader = CandleDownloader(rest, root, rate=None)
+    assert downloader.download(["EUR/USD"], START, START + 10 * DAY) == []
+    assert len(downloader.store.read("EUR/USD", START, START + 10 * DAY + 1)) == 10 * 24 + 1
+
+    # A second run over a longer range, with the manifest reloaded
+    # from disk as after a restart
+    downloader = CandleDownloader(rest, root, rate=None)
+    assert downloader.download(["EUR/USD"], START, START + 40 * DAY) == []
+    assert rest.requests[-1][1:] == (START, START + 40 * DAY)
+    assert len(downloader.store.read("EUR/USD", START, START + 40 * DAY + 1)) == 40 * 24 + 1
+
+    # Nothing is left to fetch for the same range
+    requests = len(rest.requests)
+    assert downloader.download(["EUR/USD"], START, START + 40 * DAY) == []
+    assert len(rest.requests) == requests
+
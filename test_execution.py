@@ -0,0 +1,58 @@
+import threading
+import time
+
+import numpy as np
+
+from event import OrderEvent
+from execution import BatchExecution, time_to_ns
+from price import times_to_ns
+
+
+class SlowBuyRESTaccessor(object):
+    """
+    Records the orders it is sent, taking longer over buys than
+    sells so that a sell sent alongside the buy before it would
+    be recorded first.
+    """
+    ACCOUNT_ID = '1'
+    pool_size = 8
+
+    def __init__(self):
+        self.orders = []
+        self.lock = threading.Lock()
+
+    def post_request_processor(self, method, params):
+        if params['is_buy'] == 'true':
+            time.sleep(0.02)
+        with self.lock:
+            self.orders.append((params['symbol'], params['is_buy']))
+        return True, {"response": {"executed": True}}
+
+
+def test_flush_keeps_each_instruments_orders_in_order():
+    rest = SlowBuyRESTaccessor()
+    execution = BatchExecution(rest)
+    sent = [
+        OrderEvent(pair, 1000, "AtMarket", "true" if i % 2 == 0 else "false")
+        for i in range(6) for pair in ("EUR/USD", "USD/JPY", "GBP/USD")
+    ]
+    for order in sent:
+        execution.execute_order(order)
+
+    results = execution.flush()
+
+    assert [event for event, status, response in results] == sent
+    assert all(status is True for event, status, response in results)
+    for pair in ("EUR/USD", "USD/JPY", "GBP/USD"):
+        received = [side for symbol, side in rest.orders if symbol == pair]
+        assert received == [o.side for o in sent if o.instrument == pair]
+
+
+def test_price_handler_times_match_the_broker_clock():
+    for times in (
+        np.array(["2017-01-01 00:00:00", "2017-01-01 00:00:01.250000"], dtype=object),
+        np.array([1483228800, 1483228801]),
+        np.array([1483228800.5, 1483228801.25]),
+        np.array(["2017-01-01T00:00:00", "2017-01-02T12:30:00"], dtype="datetime64[s]")
+    ):
+        assert times_to_ns(times).tolist() == [time_to_ns(t) for t in times.tolist()]
@@ -0,0 +1,60 @@
+import contextlib
+import io
+import threading
+
+import event
+from backtest import Backtest
+from execution import SimulatedExecution
+from latency import LatencyHistogram, PipelineMonitor
+from portfolio import Portfolio
+from price import HistoricCSVPriceHandler
+from restful import RESTaccessor
+from strategy import MovingAverageCrossStrategy
+from testdata import write_prices_csv
+
+
+def test_concurrent_latency_records_are_all_counted():
+    rest = RESTaccessor('1', 'http://127.0.0.1:1', 1, 'token')
+    num_threads, per_thread = 8, 20000
+
+    def worker(n):
+        for i in range(per_thread):
+            rest.record_latency('/trading/open_trade/%d' % (i % 4), (n * per_thread + i) % 997 / 1e4)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(num_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    summary = rest.latency_summary()
+    assert sum(s["count"] for s in summary.values()) == num_threads * per_thread
+    for hist in rest.latency.values():
+        assert sum(hist.counts.values()) == hist.count
+
+
+def test_merge_adds_the_other_histogram():
+    a, b = LatencyHistogram(), LatencyHistogram()
+    for i in range(100):
+        a.record(i / 1000.0)
+        b.record(i / 100.0)
+    a.merge(b)
+    assert a.count == 200
+    assert a.min == 0.0 and a.max == 0.99
+
+
+def test_monitored_backtest_stops_stamping_when_it_ends(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_prices_csv("EUR/USD", 0, 500)
+    monitor = PipelineMonitor()
+    backtest = Backtest(
+        ["EUR/USD"], HistoricCSVPriceHandler, MovingAverageCrossStrategy,
+        {"short_window": 5, "long_window": 20}, Portfolio, SimulatedExecution,
+        monitor=monitor
+    )
+    assert not event.STAMP_EVENTS
+    with contextlib.redirect_stdout(io.StringIO()):
+        backtest.simulate_trading()
+
+    assert monitor.stages["queue_wait.TICK"].count > 0
+    assert not event.STAMP_EVENTS
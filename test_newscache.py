@@ -0,0 +1,75 @@
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+import numpy as np
+import pandas as pd
+
+from event import TickEvent
+from newscache import EconCalendarCache, FileCalendarSource
+from strategy import NewsDrivenStrategy
+
+
+def write_calendar(path, rows):
+    pd.DataFrame(rows, columns=["id", "currency", "actual", "previous"]).to_csv(
+        path, index=False
+    )
+
+
+def news_signals(strategy, events, time):
+    strategy.calculate_signals(TickEvent("EUR/USD", time, 1.1, 1.1))
+    signals = []
+    while not events.empty():
+        signals.append(events.get())
+    return signals
+
+
+def test_release_is_traded_once_its_actual_is_published(tmp_path):
+    path = str(tmp_path / "calendar.csv")
+    write_calendar(path, [(1, "USD", np.nan, 1.0)])
+    cache = EconCalendarCache(FileCalendarSource(path))
+    cache.refresh()
+    events = queue.Queue()
+    strategy = NewsDrivenStrategy("EUR/USD", events, calendar=cache)
+
+    assert news_signals(strategy, events, 0) == []
+    assert cache.next_untraded("USD") is not None
+
+    write_calendar(path, [(1, "USD", 2.0, 1.0)])
+    changed = cache.refresh()
+    assert [key for key, event in changed] == [1]
+
+    signals = news_signals(strategy, events, 1)
+    assert [s.side for s in signals] == ["false"]
+    assert cache.next_untraded("USD") is None
+    assert news_signals(strategy, events, 2) == []
+
+
+def test_pending_release_does_not_hold_up_later_ones(tmp_path):
+    path = str(tmp_path / "calendar.csv")
+    write_calendar(path, [(1, "USD", np.nan, 1.0), (2, "USD", 0.5, 1.0)])
+    cache = EconCalendarCache(FileCalendarSource(path))
+    cache.refresh()
+    events = queue.Queue()
+    strategy = NewsDrivenStrategy("EUR/USD", events, calendar=cache)
+
+    assert [s.side for s in news_signals(strategy, events, 0)] == ["true"]
+    assert cache.next_untraded("USD")[0] == 1
+
+
+def test_refresh_keeps_events_marked_traded(tmp_path):
+    path = str(tmp_path / "calendar.csv")
+    pd.DataFrame({
+        "currency": ["USD", "EUR"],
+        "actual": [1.0, 1.0],
+        "previous": [2.0, 2.0],
+        "trading": np.array([True, False])
+    }).to_csv(path)
+    cache = EconCalendarCache(FileCalendarSource(path))
+    cache.refresh()
+    assert cache.next_untraded("USD") is None
+    cache.mark_traded(cache.next_untraded("EUR")[0])
+
+    assert cache.refresh() == []
+    assert cache.next_untraded("EUR") is None
@@ -0,0 +1,61 @@
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from event import FillEvent, TickEvent
+from portfolio import Portfolio
+from position import PRICE_SCALE
+
+
+class Ticker(object):
+    def __init__(self, pairs):
+        self.pairs = pairs
+        self.prices = dict((p, {"bid": None, "ask": None, "time": None}) for p in pairs)
+
+    def tick(self, pair, bid, ask):
+        self.prices[pair].update(bid=bid, ask=ask)
+        return TickEvent(pair, 0, bid, ask)
+
+
+def live_portfolio():
+    ticker = Ticker(["EUR/USD", "GBP/USD"])
+    ticker.tick("EUR/USD", 1.10000, 1.10000)
+    ticker.tick("GBP/USD", 1.30000, 1.30000)
+    portfolio = Portfolio(ticker, queue.Queue(), backtest=False, fill_on_signal=False)
+    return ticker, portfolio
+
+
+def open_profit(portfolio):
+    return sum(ps.profit_base_fixed for ps in portfolio.positions.values())
+
+
+def test_partial_fills_keep_the_open_profit_in_step():
+    ticker, portfolio = live_portfolio()
+    portfolio.on_fill(FillEvent("EUR/USD", 100, "true", 1.10000, 0, None))
+    portfolio.update_portfolio(ticker.tick("EUR/USD", 1.20000, 1.20000))
+    before = portfolio.total_equity()
+    assert open_profit(portfolio) == portfolio.unrealised_fixed
+
+    # Half the position closes with no price move, so equity holds
+    portfolio.on_fill(FillEvent("EUR/USD", 50, "false", 1.20000, 1, None))
+    assert portfolio.positions["EUR/USD"].units == 50
+    assert open_profit(portfolio) == portfolio.unrealised_fixed
+    assert abs(portfolio.total_equity() - before) < 0.01
+
+    # Adding units at the current price leaves equity unchanged too
+    portfolio.on_fill(FillEvent("EUR/USD", 50, "true", 1.20000, 2, None))
+    assert open_profit(portfolio) == portfolio.unrealised_fixed
+    assert abs(portfolio.total_equity() - before) < 0.01
+
+    # Another pair ticking does not change the EUR/USD figures
+    portfolio.update_portfolio(ticker.tick("GBP/USD", 1.30010, 1.30010))
+    assert portfolio.unrealised_fixed == open_profit(portfolio)
+    assert portfolio.pair_profits()[0] == portfolio.positions["EUR/USD"].profit_base_fixed / PRICE_SCALE
+
+
+def test_live_portfolio_keeps_no_trade_log():
+    ticker, portfolio = live_portfolio()
+    for i in range(10):
+        portfolio.on_fill(FillEvent("EUR/USD", 100, "true" if i % 2 == 0 else "false", 1.1, i, None))
+    assert portfolio.trades == []
@@ -0,0 +1,162 @@
+import random
+from decimal import Decimal, ROUND_HALF_DOWN, getcontext, localcontext
+
+import pytest
+
+from position import Position
+
+
+class DecimalPosition(object):
+    """
+    The original Decimal implementation of Position, kept as the
+    reference the fixed-point arithmetic must reproduce exactly.
+    """
+    def __init__(self, home_currency,position_type, currency_pair, units, ticker):
+        self.home_currency = home_currency
+        self.position_type = position_type
+        self.currency_pair = currency_pair
+        self.units = units
+        self.ticker = ticker
+        self.set_up_currencies()
+        self.profit_base = self.calculate_profit_base()
+        self.profit_perc = self.calculate_profit_perc()
+
+    def set_up_currencies(self):
+        ticker_cur = self.ticker.prices[self.currency_pair]
+        if self.position_type == "long":
+            self.avg_price = Decimal(str(ticker_cur["ask"]))
+            self.cur_price = Decimal(str(ticker_cur["bid"]))
+        else:
+            self.avg_price = Decimal(str(ticker_cur["bid"]))
+            self.cur_price = Decimal(str(ticker_cur["ask"]))
+
+    def calculate_pips(self):
+        mult = Decimal("1000")
+        if self.position_type == "long":
+            mult = Decimal("1000")
+        elif self.position_type == "short":
+            mult = Decimal("-1000")
+        pips = (mult * (self.cur_price - self.avg_price)).quantize(
+            Decimal("0.00001"), ROUND_HALF_DOWN
+        )
+        return pips
+
+    def calculate_profit_base(self):
+        pips = self.calculate_pips()
+        ticker_qh = self.ticker.prices[self.currency_pair]
+        if self.position_type == "long":
+            qh_close = Decimal(str(ticker_qh["bid"]))
+        else:
+            qh_close = Decimal(str(ticker_qh["ask"]))
+        profit = pips * qh_close * Decimal(str(self.units))
+        return profit.quantize(
+            Decimal("0.00001"), ROUND_HALF_DOWN
+        )
+
+    def calculate_profit_perc(self):
+        return (self.profit_base / self.units * Decimal("100.00")).quantize(
+            Decimal("0.00001"), ROUND_HALF_DOWN
+        )
+
+    def update_position_price(self):
+        ticker_cur = self.ticker.prices[self.currency_pair]
+        if self.position_type == "long":
+            self.cur_price = Decimal(str(ticker_cur["bid"]))
+        else:
+            self.cur_price = Decimal(str(ticker_cur["ask"]))
+        self.profit_base = self.calculate_profit_base()
+        self.profit_perc = self.calculate_profit_perc()
+
+    def add_units(self, units):
+        cp = self.ticker.prices[self.currency_pair]
+        if self.position_type == "long":
+            add_price = cp["ask"]
+        else:
+            add_price = cp["bid"]
+        new_total_units = self.units + units
+        new_total_cost = self.avg_price * self.units + add_price * units
+        self.avg_price = new_total_cost / new_total_units
+        self.units = new_total_units
+
+    def remove_units(self, units):
+        dec_units = Decimal(str(units))
+        ticker_quote = self.ticker.prices[self.currency_pair]
+        if self.position_type == "long":
+            quote_close = ticker_quote["ask"]
+        else:
+            quote_close = ticker_quote["bid"]
+        self.units -= dec_units
+        # Calculate PnL
+        pnl = self.calculate_pips() * quote_close * dec_units
+        getcontext().rounding = ROUND_HALF_DOWN
+        return pnl.quantize(Decimal("0.01"))
+
+    def close_position(self):
+        ticker_quote = self.ticker.prices[self.currency_pair]
+        if self.position_type == "long":
+            quote_close = Decimal(str(ticker_quote["bid"]))
+        else:
+            quote_close = Decimal(str(ticker_quote["ask"]))
+        # Calculate PnL
+        pnl = self.calculate_pips() * quote_close * Decimal(str(self.units))
+        getcontext().rounding = ROUND_HALF_DOWN
+        return pnl.quantize(Decimal("0.01"))
+
+
+class Ticker(object):
+    def __init__(self):
+        self.prices = {}
+
+
+def quote(price):
+    return Decimal(str(round(price, 5))).quantize(Decimal("0.00001"))
+
+
+def set_prices(ticker, rng, pair, mid):
+    bid = quote(mid)
+    ask = quote(mid + rng.uniform(0, 0.01))
+    ticker.prices[pair] = {"bid": bid, "ask": ask, "time": 0}
+
+
+def assert_decimal_equal(value, expected):
+    # Equal in value and in decimal places; the reference can give
+    # -0.00000 where the fixed-point version gives 0.00000
+    assert value == expected
+    assert value.as_tuple().exponent == expected.as_tuple().exponent
+
+
+def assert_same(reference, position):
+    assert_decimal_equal(position.profit_base, reference.profit_base)
+    assert_decimal_equal(position.profit_perc, reference.profit_perc)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_fixed_point_matches_decimal_reference(seed):
+    rng = random.Random(seed)
+    pair = "EUR/USD"
+    # The reference changes the context's rounding as it goes
+    with localcontext():
+        for trial in range(500):
+            ticker = Ticker()
+            mid = rng.uniform(0.5, 150)
+            set_prices(ticker, rng, pair, mid)
+            position_type = rng.choice(["long", "short"])
+            units = rng.randint(1, 5000)
+            reference = DecimalPosition("USD", position_type, pair, units, ticker)
+            position = Position("USD", position_type, pair, units, ticker)
+            assert_same(reference, position)
+            for step in range(20):
+                mid *= 1 + rng.gauss(0, 0.003)
+                set_prices(ticker, rng, pair, mid)
+                r = rng.random()
+                if r < 0.1:
+                    extra = rng.randint(1, 500)
+                    reference.add_units(extra)
+                    position.add_units(extra)
+                elif r < 0.15 and reference.units > 1:
+                    removed = rng.randint(1, int(reference.units) - 1)
+                    assert_decimal_equal(position.remove_units(removed), reference.remove_units(removed))
+                reference.update_position_price()
+                position.update_position_price()
+                assert_same(reference, position)
+            assert_decimal_equal(position.close_position(), reference.close_position())
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from recorder import EquityRecorder
+
+
+def record_rows(recorder, times):
+    for i, t in enumerate(times):
+        recorder.record(t, [float(i), 2.0 * i])
+    return recorder.to_dataframe()
+
+
+def test_spilled_datetimes_reload_as_datetimes(tmp_path):
+    times = pd.date_range("2017-05-07", periods=25, freq="s")
+    df = record_rows(EquityRecorder(["a", "b"], capacity=4, spill_dir=str(tmp_path), spill_rows=8), times)
+    expected = record_rows(EquityRecorder(["a", "b"]), times)
+
+    assert isinstance(df.index, pd.DatetimeIndex)
+    assert list(df.index) == list(times)
+    np.testing.assert_array_equal(df.values, expected.values)
+
+
+def test_spilled_timezone_is_kept(tmp_path):
+    times = pd.date_range("2017-05-07", periods=20, freq="s", tz="UTC")
+    df = record_rows(EquityRecorder(["a", "b"], capacity=4, spill_dir=str(tmp_path), spill_rows=8), times)
+
+    assert list(df.index) == list(times)
+
+
+def test_spilled_epoch_times_reload_as_integers(tmp_path):
+    times = [1494086400000 + 250 * i for i in range(17)]
+    df = record_rows(EquityRecorder(["a", "b"], capacity=4, spill_dir=str(tmp_path), spill_rows=8), times)
+
+    assert df.index.dtype == np.int64
+    assert list(df.index) == times
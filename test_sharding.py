@@ -0,0 +1,139 @@
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+import pytest
+
+from event import SignalEvent
+from portfolio import Portfolio
+from execution import SimulatedExecution
+from sharding import (
+    ShardTicker, ShardedTradingSupervisor, flatten, gross_units, is_exit, run_shard
+)
+from strategy import Strategy
+
+PAIRS = ["EUR/USD", "USD/JPY"]
+
+
+class FailingStrategy(Strategy):
+    def __init__(self, instruments, events):
+        self.instruments = instruments
+
+    def calculate_signals(self, event):
+        raise RuntimeError("strategy failed")
+
+
+class ScriptedStrategy(Strategy):
+    """
+    Signals "true" and later "false" at fixed tick times, as a
+    long-only strategy entering and exiting a position does.
+    """
+    def __init__(self, instruments, events, script):
+        self.events = events
+        self.script = script
+
+    def calculate_signals(self, event):
+        side = self.script.get(event.time)
+        if side is not None:
+            self.events.put(SignalEvent(event.instrument, "AtMarket", side, event.time))
+
+
+class ScriptedConn(object):
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    def recv(self):
+        return self.messages.pop(0)
+
+
+def run_scripted_shard(messages):
+    """
+    Runs a shard in this process over "messages" and returns the
+    gross units it reports after every tick.
+    """
+    reports = queue.Queue()
+    run_shard(
+        0, ["EUR/USD"], ScriptedConn(messages), reports, ScriptedStrategy,
+        {"script": {5: "true", 9: "false"}}, {"risk_per_trade": 0.002},
+        SimulatedExecution, 1
+    )
+    units = []
+    while not reports.empty():
+        units.append(reports.get()[2])
+    return units
+
+
+def ticks(times):
+    return ("ticks", [("EUR/USD", t, 1.1, 1.1001) for t in times])
+
+
+def shard_portfolio():
+    ticker = ShardTicker(PAIRS)
+    ticker.update_prices("EUR/USD", 0, 1.10000, 1.10010)
+    ticker.update_prices("USD/JPY", 0, 110.000, 110.010)
+    events = queue.Queue()
+    portfolio = Portfolio(ticker, events, backtest=False, equity=250000.0, risk_per_trade=0.008)
+    return ticker, events, portfolio
+
+
+def test_shards_trade_the_same_units_as_the_account():
+    supervisor = ShardedTradingSupervisor(PAIRS * 2, FailingStrategy, num_shards=4)
+    params = supervisor.portfolio_params
+    assert int(params["equity"] * params["risk_per_trade"] / 1000) == 2
+
+
+def test_zero_unit_trades_are_rejected():
+    with pytest.raises(ValueError):
+        ShardedTradingSupervisor(PAIRS, FailingStrategy, num_shards=2, equity=100000.0)
+
+
+def test_exits_are_recognised_and_flatten_closes_everything():
+    ticker, events, portfolio = shard_portfolio()
+    portfolio.execute_signal(SignalEvent("EUR/USD", "AtMarket", "true", 0))
+    portfolio.execute_signal(SignalEvent("USD/JPY", "AtMarket", "false", 0))
+    assert gross_units(portfolio) == 4
+
+    assert is_exit(portfolio, SignalEvent("EUR/USD", "AtMarket", "false", 1))
+    assert not is_exit(portfolio, SignalEvent("EUR/USD", "AtMarket", "true", 1))
+    assert is_exit(portfolio, SignalEvent("USD/JPY", "AtMarket", "true", 1))
+
+    flatten(portfolio, ticker)
+    assert portfolio.positions == {}
+    assert gross_units(portfolio) == 0
+
+
+def test_dead_shard_halts_the_rest():
+    supervisor = ShardedTradingSupervisor(PAIRS, FailingStrategy, num_shards=2)
+    supervisor.start()
+    try:
+        supervisor.publish([("EUR/USD", 0, 1.1, 1.1001)])
+        supervisor.processes[0].join(10.0)
+        supervisor.poll()
+        assert supervisor.dead == set([0])
+        assert supervisor.halted
+        supervisor.publish([("EUR/USD", 1, 1.1, 1.1001), ("USD/JPY", 1, 110.0, 110.01)])
+    finally:
+        supervisor.stop(timeout=5.0)
+    assert not supervisor.processes[1].is_alive()
+
+
+def test_exit_of_an_entry_dropped_while_halted_is_dropped():
+    units = run_scripted_shard([
+        ticks(range(5)), ("halt",), ticks([5, 6]), ("resume",), ticks(range(7, 12)), None
+    ])
+    assert units == [0] * 13
+
+
+def test_halt_still_lets_exits_through():
+    units = run_scripted_shard([
+        ticks(range(7)), ("halt",), ticks(range(7, 12)), None
+    ])
+    assert units == [0] * 5 + [2] * 4 + [0] * 4
+
+
+def test_exit_of_a_flattened_position_is_dropped():
+    units = run_scripted_shard([
+        ticks(range(7)), ("flatten",), ticks(range(7, 12)), None
+    ])
+    assert units == [0] * 5 + [2] * 2 + [0] * 6
@@ -0,0 +1,53 @@
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+from decimal import Decimal
+
+import pytest
+
+from event import TickEvent, TickBatch
+from strategy import MovingAverageCrossStrategy
+from testdata import tie_heavy_ticks
+
+PAIRS = ["EUR/USD", "GBP/USD"]
+
+
+def random_ticks(seed, num_ticks=20000):
+    return [(pair, i, mid / 1e5) for pair, i, mid in tie_heavy_ticks(PAIRS, seed, num_ticks)]
+
+
+def per_tick_signals(ticks, short_window, long_window):
+    events = queue.Queue()
+    strategy = MovingAverageCrossStrategy(PAIRS, events, short_window, long_window)
+    signals = []
+    for i, (pair, time, bid) in enumerate(ticks):
+        price = Decimal(str(bid)).quantize(Decimal("0.00001"))
+        strategy.calculate_signals(TickEvent(pair, time, price, price))
+        while not events.empty():
+            signal = events.get()
+            signals.append((i, signal.instrument, signal.side))
+    return signals
+
+
+def batch_signals(ticks, short_window, long_window, batch_size):
+    strategy = MovingAverageCrossStrategy(PAIRS, queue.Queue(), short_window, long_window)
+    signals = []
+    for start in range(0, len(ticks), batch_size):
+        rows = ticks[start:start + batch_size]
+        batch = TickBatch(
+            [r[0] for r in rows], [r[1] for r in rows],
+            [r[2] for r in rows], [r[2] for r in rows]
+        )
+        for i, signal in strategy.calculate_signals_batch(batch):
+            signals.append((start + i, signal.instrument, signal.side))
+    return signals
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("batch_size", [997, 10000])
+def test_batch_signals_match_per_tick(seed, batch_size):
+    ticks = random_ticks(seed)
+    expected = per_tick_signals(ticks, 5, 20)
+    assert expected
+    assert batch_signals(ticks, 5, 20, batch_size) == expected
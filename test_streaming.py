@@ -0,0 +1,26 @@
+import json
+
+import pytest
+
+from streaming import PRICE_UPDATE_RE, parse_price_update, parse_price_update_json
+
+MESSAGES = [
+    '{"Updated":1504167580000,"Rates":[1.19121,1.19125,1.19326,1.18822],"Symbol":"EUR/USD"}',
+    '{"Updated":1504167580000,"Rates":[109.785,109.79],"Symbol":"USD/JPY"}',
+    '{"Updated":1504167580000,"Rates":[1.19121,1.19125],"Symbol":"EUR/USD","Extra":1}',
+    # A symbol with an escaped slash, as JSON encoders may send it
+    '{"Updated":1504167580000,"Rates":[1.19121,1.19125],"Symbol":"EUR\\/USD"}',
+    '{"Symbol":"EUR/USD","Updated":1504167580000,"Rates":[1.19121,1.19125]}',
+    '{"Updated": 1504167580000, "Rates": [1.19121, 1.19125], "Symbol": "EUR/USD"}',
+]
+
+
+@pytest.mark.parametrize("msg", MESSAGES)
+def test_fast_parser_matches_the_json_decoder(msg):
+    assert parse_price_update(msg) == parse_price_update_json(msg)
+
+
+def test_escaped_symbols_are_left_to_the_decoder():
+    msg = json.dumps({"Updated": 1, "Rates": [1.1, 1.2], "Symbol": "EUR/USD"}).replace("/", "\\/")
+    assert PRICE_UPDATE_RE.match(msg.replace(" ", "")) is None
+    assert parse_price_update(msg)[0] == "EUR/USD"
@@ -0,0 +1,50 @@
+import contextlib
+import io
+
+import pytest
+
+from backtest import Backtest
+from execution import SimulatedExecution
+from portfolio import Portfolio
+from price import HistoricCSVPriceHandler
+from strategy import MovingAverageCrossStrategy
+from testdata import write_prices_csv
+from vectorized import VectorizedMACrossBacktest, load_csv_prices
+
+
+def run_backtest(pair, short_window, long_window, batch_size=0):
+    backtest = Backtest(
+        [pair], HistoricCSVPriceHandler, MovingAverageCrossStrategy,
+        {"short_window": short_window, "long_window": long_window},
+        Portfolio, SimulatedExecution, batch_size=batch_size
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        backtest.simulate_trading()
+    return backtest
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_vectorized_matches_event_driven_backtest(tmp_path, monkeypatch, seed):
+    monkeypatch.chdir(tmp_path)
+    write_prices_csv("EUR/USD", seed)
+    backtest = run_backtest("EUR/USD", 5, 20)
+    vectorized = VectorizedMACrossBacktest(load_csv_prices("EUR/USD"))
+
+    df = vectorized.run(5, 20)
+    trades = backtest.portfolio.trades
+    assert list(df.index[df["Signal"] != ""]) == [t[0] for t in trades]
+    max_diff, ok = vectorized.compare_to_backtest(
+        backtest.results.equity_curve, 5, 20
+    )
+    assert ok, max_diff
+
+
+def test_compare_to_backtest_rejects_a_length_mismatch(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_prices_csv("EUR/USD", 0, 500)
+    backtest = run_backtest("EUR/USD", 5, 20)
+    vectorized = VectorizedMACrossBacktest(load_csv_prices("EUR/USD"))
+
+    equity = backtest.results.equity_curve
+    assert vectorized.compare_to_backtest(equity, 5, 20)[1]
+    assert vectorized.compare_to_backtest(equity.iloc[:-10], 5, 20) == (float("inf"), False)
@@ -0,0 +1,35 @@
+import random
+
+import pandas as pd
+
+
+def tie_heavy_ticks(pairs, seed, num_ticks):
+    """
+    Returns (pair, index, mid) ticks of independent random walks,
+    one per pair, with mids in 1e-5 units. Most ticks leave the
+    mid unchanged, so moving averages over them regularly tie and
+    any inexact comparison between two engines shows up.
+    """
+    rng = random.Random(seed)
+    mids = dict((pair, 110000) for pair in pairs)
+    ticks = []
+    for i in range(num_ticks):
+        pair = rng.choice(pairs)
+        if rng.random() < 0.3:
+            mids[pair] += rng.choice([-1, 1]) * rng.randint(1, 3)
+        ticks.append((pair, i, mids[pair]))
+    return ticks
+
+
+def write_prices_csv(pair, seed, num_ticks=5000):
+    """
+    Writes tie_heavy_ticks for one pair, one second apart and with
+    a two point spread, to the CSV HistoricCSVPriceHandler reads.
+    """
+    mids = [mid for _, _, mid in tie_heavy_ticks([pair], seed, num_ticks)]
+    times = pd.to_datetime(1483228800 + pd.RangeIndex(num_ticks), unit="s").astype(str)
+    pd.DataFrame({
+        "time": times,
+        "bidopen": [(mid - 1) / 1e5 for mid in mids],
+        "askopen": [(mid + 1) / 1e5 for mid in mids]
+    }).to_csv("%s.csv" % pair.replace("/", ""), index=False)
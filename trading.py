@@ -1,49 +1,95 @@
-import queue
 import threading
-import time
 from socketIO_client import SocketIO
 import logging
 
-from execution import Execution
+from execution import Execution, BatchExecution
 from strategy import TestRandomStrategy, MovingAverageCrossStrategy, NewsDrivenStrategy
 from streaming import StreamingForexPrices
 from restful import RESTaccessor
 from portfolio import Portfolio
+from dispatcher import EventDispatcher
+from event import stamping
+from latency import PipelineMonitor
+from bars import BarAggregator
+from conflation import ConflatingEventQueue
 
 
-def trade(events, strategy, portfolio, execution, heartbeat):
+class OrderResults(object):
     """
-    Carries out an infinite while loop that polls the
-    events queue and directs each event to either the
-    strategy component of the execution handler. The
-    loop will then pause for "heartbeat" seconds and
-    continue.
+    OrderResults receives the (event, status, response) tuples of
+    each BatchExecution flush and keeps a count of the orders
+    executed and failed, logging any failures.
     """
-    while True:
-        try:
-            event = events.get(False)
-        except queue.Empty:
-            pass
+    def __init__(self):
+        self.executed = 0
+        self.failed = []
+        self.logger = logging.getLogger(__name__)
+
+    def __call__(self, results):
+        for event, status, response in results:
+            if status is True:
+                self.executed += 1
+            else:
+                self.failed.append((event, response))
+                self.logger.error("Order failed (%d so far): %s: %s" % (
+                    len(self.failed), event, response
+                ))
+
+
+def trade(events, strategy, portfolio, execution, heartbeat, monitor=None,
+          bar_timeframes=None, on_order_results=None):
+    """
+    Dispatches events from the events queue forever, directing
+    each event to the strategy, portfolio or execution handler.
+    The loop blocks on the queue for up to "heartbeat" seconds
+    at a time instead of polling it, so ticks are handled as
+    soon as they arrive. Execution handlers that batch their
+    orders are flushed after every drained batch of events, and
+    the results of each flush are passed to "on_order_results".
+
+    If a PipelineMonitor is given, events are timestamped until
+    dispatching stops, and the queue wait, strategy, portfolio,
+    execution and REST round-trip latencies are reported through
+    it.
+
+    If "bar_timeframes" are given, ticks are also aggregated into
+    bars, which are passed to the strategy's calculate_bar_signals.
+    With a ConflatingEventQueue the bars are fed every tick as it
+    is put, so conflation does not drop ticks from their OHLC and
+    volume.
+    """
+    if monitor is not None:
+        rest = getattr(execution, 'RESTaccess', None)
+        if rest is not None:
+            monitor.add_source('rest', rest.latency)
+    dispatcher = EventDispatcher(events, timeout=heartbeat, monitor=monitor)
+    dispatcher.register('TICK', strategy.calculate_signals, 'strategy')
+    if bar_timeframes:
+        bars = BarAggregator(events, bar_timeframes)
+        if hasattr(events, 'add_tick_listener'):
+            events.add_tick_listener(bars.on_tick)
         else:
-            if event is not None:
-                if event.type == 'TICK':
-                    strategy.calculate_signals(event)
-                    portfolio.update_portfolio(event)
-                elif event.type == 'SIGNAL':
-                    portfolio.execute_signal(event)
-                elif event.type == 'ORDER':
-                    execution.execute_order(event)
-        time.sleep(heartbeat)
+            dispatcher.register('TICK', bars.on_tick, 'bars')
+        dispatcher.register('BAR', strategy.calculate_bar_signals, 'strategy.bar')
+    dispatcher.register('TICK', portfolio.update_portfolio, 'portfolio')
+    dispatcher.register('SIGNAL', portfolio.execute_signal, 'portfolio.signal')
+    dispatcher.register('ORDER', execution.execute_order, 'execution')
+    if hasattr(execution, 'flush'):
+        dispatcher.register_flush(execution.flush, on_order_results)
+    with stamping(monitor is not None):
+        dispatcher.run()
 
 if __name__ == "__main__":
     # Set up logging
     logging.basicConfig(filename = 'trading.log', level = logging.INFO)
     logger = logging.getLogger('EventDrivenBacktester.trading.log')
 
-    # Half a second between polling
+    # Wait up to half a second for an event before re-checking
     heartbeat = 0.5
-    # Events for trading
-    events = queue.Queue()
+    # Events for trading. Ticks are conflated to the latest quote
+    # per instrument, so a slow strategy never falls behind the
+    # market during a burst of updates
+    events = ConflatingEventQueue()
 
     # Trade 1000 units of EUR/USD
     instrument = ["EUR/USD"]
@@ -69,8 +115,14 @@ if __name__ == "__main__":
     portfolio = Portfolio(prices, events, backtest = False, equity=1000000.0)
 
     # Create the execution handler making sure to
-    # provide authentication commands
-    execution = Execution(RESTaccess)
+    # provide authentication commands. BatchExecution submits
+    # the orders of each dispatch cycle concurrently.
+    batch_orders = False
+    if batch_orders:
+        execution = BatchExecution(RESTaccess)
+    else:
+        execution = Execution(RESTaccess)
+    order_results = OrderResults()
 
     # Create the strategy/signal generator, passing the
     # instrument, quantity of units and the events queue
@@ -78,9 +130,13 @@ if __name__ == "__main__":
     strategy = MovingAverageCrossStrategy(instrument,events)
     #strategy = NewsDrivenStrategy(instrument,events)
 
+    # Report per-stage pipeline latencies to the log every minute
+    monitor = PipelineMonitor(report_interval=60.0)
+
     # Create two separate threads: One for the trading loop
     # and another for the market price streaming class
-    trade_thread = threading.Thread(target=trade, args=(events, strategy, portfolio, execution, heartbeat))
+    trade_thread = threading.Thread(target=trade, args=(events, strategy, portfolio, execution, heartbeat, monitor),
+                                    kwargs={'on_order_results': order_results})
     price_thread = threading.Thread(target=prices.stream_to_queue, args=[])
     # Start both threads
     logger.info("Starting trading thread")
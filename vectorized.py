@@ -0,0 +1,159 @@
+import itertools
+import numpy as np
+import pandas as pd
+
+from indicators import rolling_sums, compare_averages
+from position import PRICE_SCALE
+
+
+def load_csv_prices(pair, bid_column="bidopen", ask_column="askopen"):
+    """
+    Reads the bid/ask columns of a 'pair.csv' file into a
+    DataFrame with "bid" and "ask" columns indexed by time.
+    """
+    df = pd.read_csv(
+        "%s.csv" % pair.replace("/", ""),
+        usecols=["time", bid_column, ask_column], index_col=0
+    )
+    df.columns = ["bid", "ask"]
+    return df
+
+
+class VectorizedMACrossBacktest(object):
+    """
+    VectorizedMACrossBacktest reproduces a single-pair backtest of
+    MovingAverageCrossStrategy with Portfolio using whole-array
+    operations rather than the event queue. It follows the same
+    conventions as the event-driven engine:
+
+    - signals are only generated once more than "short_window"
+      ticks have been seen,
+    - a signal raised on a tick is filled at that tick's prices,
+      longs opening at the ask and closing at the bid,
+    - each output row is recorded before that tick's signal is
+      filled, exactly as Portfolio.update_portfolio does.
+
+    It is intended for parameter research where the same price
+    series is evaluated under many window combinations.
+    """
+    def __init__(
+        self, prices, equity=1000000.0, risk_per_trade=0.002
+    ):
+        """
+        "prices" is a DataFrame with "bid" and "ask" columns in
+        time order, such as returned by load_csv_prices.
+        """
+        self.prices = prices
+        self.bid = prices["bid"].values.astype(np.float64)
+        self.ask = prices["ask"].values.astype(np.float64)
+        self.equity = equity
+        self.units = int((equity * risk_per_trade) / 1000)
+        self.fixed_bid = np.rint(self.bid * PRICE_SCALE).astype(np.int64)
+        self.sums_cache = {}
+
+    def calc_rolling_sums(self, window):
+        """
+        Returns the exact fixed-point rolling sums and counts of
+        the bid for the given window, over the ticks seen so far
+        until the window fills, as RollingSMA holds them. They
+        are computed once per distinct window.
+        """
+        if window not in self.sums_cache:
+            self.sums_cache[window] = rolling_sums([], self.fixed_bid, window)
+        return self.sums_cache[window]
+
+    def calc_sma(self, window):
+        """
+        Returns the simple moving average used by the strategy
+        for the given window.
+        """
+        sums, counts = self.calc_rolling_sums(window)
+        return sums / counts / PRICE_SCALE
+
+    def calc_invested(self, short_window, long_window):
+        """
+        Returns a 0/1 array holding whether the strategy is
+        invested after processing each tick.
+        """
+        # The averages are compared exactly, as the strategy's
+        # Decimal averages are, so that ties are not broken by
+        # float rounding
+        cmp = compare_averages(
+            *(self.calc_rolling_sums(short_window) + self.calc_rolling_sums(long_window))
+        )
+        regime = np.where(cmp > 0, 1.0, np.where(cmp < 0, 0.0, np.nan))
+        regime[:short_window + 1] = 0.0
+        return pd.Series(regime).ffill().values
+
+    def run(self, short_window=5, long_window=20):
+        """
+        Returns a DataFrame of the "Balance" and open "Profit" the
+        Portfolio would record on each tick, plus the "Signal"
+        raised on each tick.
+        """
+        bid = self.bid
+        invested = self.calc_invested(short_window, long_window)
+        prev_invested = np.concatenate(([0.0], invested[:-1]))
+        entries = (invested == 1.0) & (prev_invested == 0.0)
+        exits = (invested == 0.0) & (prev_invested == 1.0)
+        entry_ask = pd.Series(np.where(entries, self.ask, np.nan)).ffill().values
+        pips = np.round(1000.0 * (bid - entry_ask), 5)
+        profit = np.where(
+            prev_invested == 1.0, np.round(pips * bid * self.units, 5), 0.0
+        )
+        realised = np.where(exits, np.round(pips * bid * self.units, 2), 0.0)
+        balance = self.equity + np.concatenate(([0.0], np.cumsum(realised)[:-1]))
+        signal = np.where(entries, "true", np.where(exits, "false", ""))
+        return pd.DataFrame(
+            {"Balance": balance, "Profit": profit, "Signal": signal},
+            index=self.prices.index
+        )
+
+    def final_equity(self, short_window, long_window):
+        """
+        Returns the balance plus open profit after the last tick.
+        """
+        df = self.run(short_window, long_window)
+        return df["Balance"].values[-1] + df["Profit"].values[-1]
+
+    def sweep(self, short_windows, long_windows):
+        """
+        Evaluates every (short_window, long_window) combination
+        with short_window < long_window and returns a DataFrame
+        ranked by final equity. Rolling averages are shared
+        between combinations.
+        """
+        results = []
+        for short_window, long_window in itertools.product(short_windows, long_windows):
+            if short_window >= long_window:
+                continue
+            results.append({
+                "short_window": short_window,
+                "long_window": long_window,
+                "equity": self.final_equity(short_window, long_window)
+            })
+        df = pd.DataFrame(results, columns=["short_window", "long_window", "equity"])
+        return df.sort_values("equity", ascending=False).reset_index(drop=True)
+
+    def compare_to_backtest(self, backtest_df, short_window, long_window, tol=0.01):
+        """
+        Checks this engine against the output of the event-driven
+        Backtest for the same pair and parameters. "backtest_df"
+        is the frame recorded by the portfolio, e.g.
+        backtest.results.equity_curve, with "Balance" and
+        "Unrealised" columns. Returns the largest absolute
+        difference in balance and open profit and whether both
+        are within "tol". Frames of different lengths never
+        match, and give a difference of inf.
+        """
+        df = self.run(short_window, long_window)
+        if len(df) != len(backtest_df):
+            return np.inf, False
+        balance_diff = np.abs(
+            df["Balance"].values - backtest_df["Balance"].values.astype(np.float64)
+        ).max()
+        profit_diff = np.abs(
+            df["Profit"].values - backtest_df["Unrealised"].values.astype(np.float64)
+        ).max()
+        max_diff = max(balance_diff, profit_diff)
+        return max_diff, max_diff <= tol